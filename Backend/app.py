@@ -1,8 +1,12 @@
+import json
 from fastapi import FastAPI, Request, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from Backend.supabase_client import supabase
-from Backend.rag import process_user_query, UserSession
+from Backend.http_client import upstream_stats
+from Backend.flow_control import Deadline
+from Backend.rag import process_user_query, stream_user_query, UserSession, get_vector_index, start_vector_index_refresher, VECTOR_SEARCH_BACKEND, get_cache_stats, get_stage_stats, get_intent_stats
 from twilio.twiml.messaging_response import MessagingResponse
 
 app = FastAPI()
@@ -16,6 +20,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def warm_vector_index():
+    if VECTOR_SEARCH_BACKEND != "memory":
+        return
+    try:
+        get_vector_index()
+    except Exception as e:
+        print(f"[ERROR] Could not load vector index at startup: {e}")
+    start_vector_index_refresher()
+
 # Pre-authenticated default user (deepak.mehta)
 DEFAULT_USERNAME = "deepak.mehta"
 
@@ -65,29 +79,70 @@ async def query(request: Request):
         user_query = data.get("query")
 
         # Always return default user session (hardcoded)
-        user_session = get_default_user_session()
+        user_session = await run_in_threadpool(get_default_user_session)
         if not user_session:
             return JSONResponse(status_code=401, content={"success": False, "message": "User session not found"})
 
-        answer = process_user_query(user_query, user_session)
+        # Off the event loop: the pipeline blocks, and concurrent requests must
+        # overlap for identical upstream calls to be coalesced
+        answer = await run_in_threadpool(process_user_query, user_query, user_session)
         return {"success": True, "answer": answer}
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"success": False, "message": str(e)})
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/query/stream")
+async def query_stream(request: Request):
+    """Server-Sent Events: one `delta` event per answer chunk, then `done`"""
+    data = await request.json()
+    user_query = data.get("query")
+
+    # Always return default user session (hardcoded)
+    user_session = await run_in_threadpool(get_default_user_session)
+    if not user_session:
+        return JSONResponse(status_code=401, content={"success": False, "message": "User session not found"})
+
+    # A sync generator: Starlette iterates it in the threadpool, so the
+    # blocking upstream reads never stall the event loop
+    def events():
+        try:
+            for delta in stream_user_query(user_query, user_session):
+                yield sse_event("delta", {"text": delta})
+            yield sse_event("done", {"success": True})
+        except Exception as e:
+            yield sse_event("error", {"success": False, "message": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/metrics")
+async def metrics():
+    return {"success": True, "caches": get_cache_stats(), "stages": get_stage_stats(), "intent": get_intent_stats(),
+            "upstreams": upstream_stats()}
+
+# Twilio gives up on the webhook after 15 seconds
+WHATSAPP_DEADLINE_SECONDS = 13
+
 # ✅ Twilio WhatsApp Webhook
 @app.post("/whatsapp")
 async def whatsapp_webhook(Body: str = Form(...), From: str = Form(...)):
     print(f"[📨 WHATSAPP] From: {From} | Message: {Body}")
 
-    user_session = get_default_user_session()
+    user_session = await run_in_threadpool(get_default_user_session)
     if not user_session:
         twiml = MessagingResponse()
         twiml.message("❌ Could not authenticate default user.")
         return Response(content=str(twiml), media_type="application/xml")
 
     try:
-        answer = process_user_query(Body, user_session)
+        answer = await run_in_threadpool(process_user_query, Body, user_session,
+                                         deadline=Deadline(WHATSAPP_DEADLINE_SECONDS))
     except Exception as e:
         print(f"[ERROR] while processing WhatsApp message: {e}")
         answer = "⚠️ An error occurred while processing your request."
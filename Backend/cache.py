@@ -0,0 +1,418 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from Backend.flow_control import DeadlineExceeded, UpstreamUnavailable
+
+
+def hash_key(*parts):
+    """Stable cache key from string parts (model, version, text, ...)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU map with hit / miss / eviction counters"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.data.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        return {
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteEmbeddingStore:
+    """Persistent key -> float32 vector store, shared by every worker on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def put(self, key, vector):
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", (key, blob))
+            self.conn.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-process LRU in front of a persistent
+    SQLite store. Keys combine the embedding model/version with a hash of the
+    (already preprocessed) text, so a model change never serves stale vectors.
+    """
+
+    def __init__(self, model_version, maxsize=2048, path=None):
+        self.model_version = model_version
+        self.memory = LRUCache(maxsize)
+        self.disk = None
+        if path:
+            try:
+                self.disk = SQLiteEmbeddingStore(path)
+            except Exception as e:
+                print(f"DEBUG: Embedding cache disk tier disabled: {e}")
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+    def key(self, text):
+        return hash_key(self.model_version, text)
+
+    def get(self, text):
+        key = self.key(text)
+        vector = self.memory.get(key)
+        if vector is not None or self.disk is None:
+            return vector
+        try:
+            vector = self.disk.get(key)
+        except Exception as e:
+            print(f"DEBUG: Embedding cache read failed: {e}")
+            vector = None
+        if vector is None:
+            self.disk_misses += 1
+            return None
+        self.disk_hits += 1
+        self.memory.put(key, vector)
+        return vector
+
+    def put(self, text, vector):
+        key = self.key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        self.memory.put(key, vector)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, vector)
+            except Exception as e:
+                print(f"DEBUG: Embedding cache write failed: {e}")
+
+    def stats(self):
+        return {
+            "model_version": self.model_version,
+            "memory": self.memory.stats(),
+            "disk": {"hits": self.disk_hits, "misses": self.disk_misses, "enabled": self.disk is not None},
+        }
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache of chat completion contents for deterministic
+    (temperature 0) stages. Keys hash the schema version, the stage and the
+    full request payload (system prompt with role info, history, user text),
+    so any prompt change misses; bumping schema_version drops everything
+    cached by an older prompt or parser. Hit rates are tracked per stage.
+    """
+
+    def __init__(self, schema_version, maxsize=1024, ttl=3600):
+        self.schema_version = schema_version
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize)
+        self.lock = threading.Lock()
+        self.stage_counts = {}
+
+    def key(self, stage, endpoint, payload):
+        return hash_key(self.schema_version, stage, endpoint, json.dumps(payload, sort_keys=True, default=str))
+
+    def count(self, stage, outcome):
+        with self.lock:
+            counts = self.stage_counts.setdefault(stage, {"hits": 0, "misses": 0, "expired": 0})
+            counts[outcome] += 1
+
+    def get(self, stage, endpoint, payload):
+        key = self.key(stage, endpoint, payload)
+        entry = self.memory.get(key)
+        if entry is None:
+            self.count(stage, "misses")
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self.memory.pop(key)
+            self.count(stage, "expired")
+            self.count(stage, "misses")
+            return None
+        self.count(stage, "hits")
+        return value
+
+    def put(self, stage, endpoint, payload, value):
+        self.memory.put(self.key(stage, endpoint, payload), (time.monotonic() + self.ttl, value))
+
+    def clear(self):
+        self.memory.clear()
+
+    def stats(self):
+        with self.lock:
+            stages = {
+                stage: {**counts, "hit_rate": round(counts["hits"] / max(counts["hits"] + counts["misses"], 1), 3)}
+                for stage, counts in self.stage_counts.items()
+            }
+        memory = self.memory.stats()
+        return {
+            "schema_version": self.schema_version,
+            "ttl": self.ttl,
+            "size": memory["size"],
+            "maxsize": memory["maxsize"],
+            "evictions": memory["evictions"],
+            "stages": stages,
+        }
+
+
+class SemanticAnswerCache:
+    """
+    Answers to earlier questions, looked up by query-embedding similarity.
+
+    Entries are partitioned by scope (role and dealer_id), so an answer is
+    only ever served to a user who could have received it, and by the
+    question's identifier and number tokens: "stock of RK-205" and "stock
+    of RK-206" embed almost identically, so `terms` must match exactly. An
+    entry hits when its cosine similarity to the new question reaches
+    `threshold` and it is younger than `ttl`. invalidate() drops everything
+    and is called whenever the underlying data changes.
+
+    Every worker process has its own cache. With a `generation_file` on
+    storage the workers share, invalidate() also replaces that file, and
+    each worker drops its entries on the next get() / put() that finds the
+    file changed, so an order placed through one worker is not answered
+    from another worker's stale stock figures.
+    """
+
+    def __init__(self, threshold=0.95, maxsize=512, ttl=900, generation_file=None):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation_file = generation_file
+        self.generation = self.read_generation()
+        self.lock = threading.Lock()
+        # (scope, terms) -> OrderedDict(id -> (unit vector, answer, query, expires_at))
+        self.scopes = {}
+        self.size = 0
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, scope, embedding, terms=()):
+        """(answer, similarity, cached query) of the closest entry in scope with the same terms, or None"""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        generation = self.read_generation()
+        with self.lock:
+            self.sync_generation(generation)
+            entries = self.scopes.get((scope, tuple(terms)))
+            now = time.monotonic()
+            if entries:
+                for entry_id in [i for i, entry in entries.items() if entry[3] < now]:
+                    del entries[entry_id]
+                    self.size -= 1
+            if not entries or norm == 0:
+                self.misses += 1
+                return None
+            ids = list(entries)
+            scores = np.stack([entries[i][0] for i in ids]) @ (query / norm)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entries.move_to_end(ids[best])
+            self.hits += 1
+            _, answer, cached_query, _ = entries[ids[best]]
+            return answer, float(scores[best]), cached_query
+
+    def put(self, scope, embedding, answer, query=None, terms=()):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        generation = self.read_generation()
+        with self.lock:
+            self.sync_generation(generation)
+            entries = self.scopes.setdefault((scope, tuple(terms)), OrderedDict())
+            entries[self.next_id] = (vector / norm, answer, query, time.monotonic() + self.ttl)
+            self.next_id += 1
+            self.size += 1
+            while self.size > self.maxsize:
+                # Evict the least recently used entry of the largest partition
+                largest = max(self.scopes, key=lambda key: len(self.scopes[key]))
+                self.scopes[largest].popitem(last=False)
+                if not self.scopes[largest]:
+                    del self.scopes[largest]
+                self.size -= 1
+
+    def read_generation(self):
+        """Identity of the shared generation file: os.replace() always gives it a new inode"""
+        if not self.generation_file:
+            return None
+        try:
+            stat = os.stat(self.generation_file)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def sync_generation(self, generation):
+        """Drop every entry when another worker invalidated since the last look (lock held)"""
+        if generation != self.generation:
+            self.generation = generation
+            self.clear()
+
+    def clear(self):
+        self.scopes.clear()
+        self.size = 0
+        self.invalidations += 1
+
+    def invalidate(self, shared=True):
+        """
+        Drop every entry; with `shared`, tell the other workers to do the same.
+        Pass shared=False when every worker sees the change for itself.
+        """
+        with self.lock:
+            self.clear()
+            if shared and self.generation_file:
+                try:
+                    os.makedirs(os.path.dirname(self.generation_file) or ".", exist_ok=True)
+                    tmp_path = f"{self.generation_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+                    with open(tmp_path, "w") as f:
+                        f.write(f"{os.getpid()} {time.time_ns()}\n")
+                    os.replace(tmp_path, self.generation_file)
+                except OSError as e:
+                    print(f"DEBUG: Could not publish answer cache invalidation: {e}")
+            self.generation = self.read_generation()
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, later callers block until it finishes and share its result
+    (or its exception). Nothing is kept once the call completes.
+
+    A follower waits no longer than its own deadline and then raises its
+    own DeadlineExceeded. When the leader ran out of time or was turned
+    away by the upstream, that says nothing about the followers' budgets,
+    so they retry (one of them becomes the new leader) instead of sharing
+    the error.
+    """
+
+    # Failures that belong to the leader's request, not to the call itself
+    LEADER_ERRORS = (DeadlineExceeded, UpstreamUnavailable)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+        self.retries = 0
+
+    def do(self, key, fn, deadline=None):
+        while True:
+            with self.lock:
+                call = self.calls.get(key)
+                if call is None:
+                    call = self.calls[key] = {"done": threading.Event(), "result": None, "error": None}
+                    self.leaders += 1
+                    leader = True
+                else:
+                    self.followers += 1
+                    leader = False
+            if leader:
+                break
+            if not call["done"].wait(deadline.remaining() if deadline is not None else None):
+                with self.lock:
+                    self.timeouts += 1
+                raise DeadlineExceeded("Deadline reached while waiting for an identical in-flight call")
+            if isinstance(call["error"], self.LEADER_ERRORS):
+                with self.lock:
+                    self.retries += 1
+                continue
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["done"].set()
+
+    def stats(self):
+        return {"inflight": len(self.calls), "leaders": self.leaders, "coalesced": self.followers,
+                "follower_timeouts": self.timeouts, "retried": self.retries}
@@ -0,0 +1,178 @@
+import re
+from numbers import Number
+
+try:
+    import tiktoken
+    ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    ENCODING = None
+
+# Word / number / punctuation pieces; close to BPE counts for this data
+PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+# Columns that never help answer a question
+SKIP_COLUMNS = {"embedding", "embedding_vec", "content_hash", "source_key", "updated_at", "is_deleted"}
+
+# Columns whose sum over rows means something (unit prices, ratings and
+# ids do not); only these are totalled for truncated SQL results
+ADDITIVE_COLUMNS = {"quantity", "available_quantity", "stock", "total_stock", "cost", "total_cost", "amount",
+                    "approved_amount", "claim_amount"}
+
+# Share of the budget each section may claim before leftovers are redistributed
+SECTION_SHARES = {"sql": 0.45, "rag": 0.4, "history": 0.15}
+
+
+def estimate_tokens(text):
+    """Token count of `text`: exact with tiktoken installed, else a local approximation"""
+    if not text:
+        return 0
+    if ENCODING is not None:
+        return len(ENCODING.encode(text))
+    # Long pieces (ids, SKUs, long words) split into several BPE tokens
+    return sum(1 + len(piece) // 6 for piece in PIECE_PATTERN.findall(text))
+
+
+def truncate_text(text, budget):
+    """Cut `text` to roughly `budget` tokens on a word boundary"""
+    if estimate_tokens(text) <= budget:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(" ".join(words[:mid])) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low]) + " …"
+
+
+def format_sql_row(row):
+    return ', '.join(f"{k}: {v}" for k, v in row.items())
+
+
+def format_vector_row(idx, row):
+    lines = [f"Vector Row {idx}:"]
+    lines += [f"{key}: {value}" for key, value in row.items() if key not in SKIP_COLUMNS and value is not None]
+    return "\n".join(lines)
+
+
+def fit_rows(rendered, budget, separator):
+    """
+    Longest prefix of the (already ranked) rendered rows that fits in
+    `budget`. Returns (text, rows kept).
+    """
+    kept, used = [], 0
+    sep_cost = estimate_tokens(separator)
+    for text in rendered:
+        cost = estimate_tokens(text) + (sep_cost if kept else 0)
+        if used + cost > budget:
+            break
+        kept.append(text)
+        used += cost
+    return separator.join(kept), len(kept)
+
+
+def numeric_totals(rows, columns=ADDITIVE_COLUMNS):
+    """Totals over all rows of the additive `columns`, for truncated SQL results"""
+    totals = {}
+    for row in rows:
+        for key, value in row.items():
+            if key in columns and isinstance(value, Number) and not isinstance(value, bool):
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def sql_section(rows, budget):
+    if not rows:
+        return "No results found."
+    separator = "\n---\n"
+    rendered = [format_sql_row(row) for row in rows]
+    text, kept = fit_rows(rendered, budget, separator)
+    if kept == len(rows):
+        return text
+    totals = numeric_totals(rows)
+
+    def summarize(kept):
+        summary = f"(showing {kept} of {len(rows)} rows"
+        if totals:
+            summary += "; totals over all rows: " + ", ".join(f"{k}={round(v, 2)}" for k, v in totals.items())
+        return summary + ")"
+
+    # The summary line comes out of the same budget as the rows
+    row_budget = max(budget - estimate_tokens(summarize(len(rows))) - 1, 0)
+    text, kept = fit_rows(rendered, row_budget, separator)
+    if not kept:
+        # Not even one full row fits: keep a truncated first row
+        text = truncate_text(rendered[0], max(row_budget, 1))
+    return f"{text}\n{summarize(kept)}"
+
+
+def rag_section(rows, budget):
+    if not rows:
+        return "No relevant vector context found."
+    rendered = [format_vector_row(idx, row) for idx, row in enumerate(rows, 1)]
+    text, kept = fit_rows(rendered, budget, "\n\n")
+    if not kept:
+        return truncate_text(rendered[0], budget)
+    if kept < len(rows):
+        text += f"\n({len(rows) - kept} lower-ranked rows omitted)"
+    return text
+
+
+def history_section(rows, budget, per_answer=120):
+    """Most recent exchanges first to survive; long answers are shortened"""
+    if not rows or budget <= 0:
+        return ""
+    exchanges = []
+    for row in rows:  # newest first
+        answer = truncate_text(str(row.get("ai_response") or ""), per_answer)
+        exchanges.append(f"User: {row.get('user_query')}\nAssistant: {answer}")
+    header = f"Last {len(rows)} conversations from this user:\n"
+    kept, used = [], estimate_tokens(header)
+    for text in exchanges:
+        cost = estimate_tokens(text) + 3
+        if used + cost > budget:
+            break
+        kept.append(text)
+        used += cost
+    if not kept:
+        return ""
+    kept.reverse()
+    return f"Last {len(kept)} conversations from this user:\n" + "".join(
+        f"\nExchange {i}:\n{text}\n" for i, text in enumerate(kept, 1)
+    )
+
+
+def allocate(needs, budget, shares=SECTION_SHARES):
+    """
+    Split `budget` across sections: each gets min(need, share), then the
+    unused remainder goes to sections that still need more, in share order.
+    """
+    grants = {name: min(needs.get(name, 0), int(budget * share)) for name, share in shares.items()}
+    left = budget - sum(grants.values())
+    for name in sorted(shares, key=shares.get, reverse=True):
+        extra = min(left, needs.get(name, 0) - grants[name])
+        if extra > 0:
+            grants[name] += extra
+            left -= extra
+    return grants
+
+
+def assemble_context(sql_rows, vector_rows, history_rows, budget):
+    """
+    Render the SQL, RAG and history sections of the final-answer prompt
+    within `budget` tokens. Rows are expected best-first (SQL in query
+    order, vector rows by fused rank, history newest first) so truncation
+    drops the least valuable rows. Returns (sql_context, rag_context, history_context).
+    """
+    needs = {
+        "sql": estimate_tokens("\n---\n".join(format_sql_row(row) for row in sql_rows or [])),
+        "rag": estimate_tokens("\n\n".join(format_vector_row(i, row) for i, row in enumerate(vector_rows or [], 1))),
+        "history": estimate_tokens(history_section(history_rows, budget)),
+    }
+    grants = allocate(needs, budget)
+    return (
+        sql_section(sql_rows, grants["sql"]),
+        rag_section(vector_rows, grants["rag"]),
+        history_section(history_rows, grants["history"]),
+    )
@@ -0,0 +1,190 @@
+import time
+import threading
+import requests
+
+
+class UpstreamUnavailable(requests.RequestException):
+    """Raised instead of calling an upstream whose breaker is open or whose queue is full"""
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit: additive increase on success, multiplicative
+    decrease when the upstream signals overload (429 / 503 / timeouts).
+    Callers beyond the current limit wait up to their queue timeout.
+    """
+
+    def __init__(self, initial=8, minimum=1, maximum=64, increase=1.0, decrease=0.5, decrease_interval=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        # A burst of 429s from one overload episode halves the limit once
+        self.decrease_interval = decrease_interval
+        self.last_decrease = 0.0
+        self.inflight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, timeout):
+        """Take a slot, waiting at most `timeout` seconds; returns the seconds queued or None"""
+        start = time.perf_counter()
+        deadline = start + max(timeout, 0)
+        with self.condition:
+            while self.inflight >= int(self.limit):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            self.inflight += 1
+        return time.perf_counter() - start
+
+    def release(self, overloaded=False, success=True):
+        with self.condition:
+            self.inflight -= 1
+            if overloaded:
+                now = time.monotonic()
+                if now - self.last_decrease >= self.decrease_interval:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.last_decrease = now
+            elif success:
+                # +increase per full window of successful calls
+                self.limit = min(self.maximum, self.limit + self.increase / max(self.limit, 1))
+            self.condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and fails fast for
+    `cooldown` seconds; then lets one probe through (half-open) and closes
+    again on its success.
+    """
+
+    def __init__(self, threshold=5, cooldown=10.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def cancel_probe(self):
+        with self.lock:
+            self.probing = False
+
+    def record(self, success):
+        with self.lock:
+            self.probing = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class Upstream:
+    """Concurrency limiter + circuit breaker + counters for one upstream endpoint"""
+
+    def __init__(self, name, limiter=None, breaker=None):
+        self.name = name
+        self.limiter = limiter or AIMDLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.lock = threading.Lock()
+        self.counts = {"calls": 0, "rejected_open": 0, "rejected_queue": 0, "overloaded": 0, "failures": 0}
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def acquire(self, queue_timeout):
+        """Admit a call or raise UpstreamUnavailable without touching the network"""
+        if not self.breaker.allow():
+            self.count("rejected_open")
+            raise UpstreamUnavailable(f"{self.name} circuit open")
+        queued = self.limiter.acquire(queue_timeout)
+        if queued is None:
+            # Hand back a half-open probe slot so the breaker is not stuck probing
+            self.breaker.cancel_probe()
+            self.count("rejected_queue")
+            raise UpstreamUnavailable(f"{self.name} concurrency limit reached")
+        with self.lock:
+            self.counts["calls"] += 1
+            self.queue_seconds += queued
+            self.max_queue_seconds = max(self.max_queue_seconds, queued)
+
+    def release(self, success, overloaded=False):
+        self.limiter.release(overloaded=overloaded, success=success)
+        self.breaker.record(success)
+        if overloaded:
+            self.count("overloaded")
+        if not success:
+            self.count("failures")
+
+    def stats(self):
+        with self.lock:
+            calls = self.counts["calls"]
+            return {
+                **self.counts,
+                "limit": round(self.limiter.limit, 2),
+                "inflight": self.limiter.inflight,
+                "breaker": self.breaker.state,
+                "avg_queue_ms": round(self.queue_seconds / calls * 1000, 1) if calls else 0.0,
+                "max_queue_ms": round(self.max_queue_seconds * 1000, 1),
+            }
+
+
+class DeadlineExceeded(requests.Timeout):
+    """The request's overall time budget ran out before this call could be made"""
+
+
+class Deadline:
+    """
+    Absolute time budget for one user request. Stages ask for the remaining
+    budget to size their own timeouts; reserve() carves out a shorter
+    deadline that leaves time for a later stage.
+    """
+
+    def __init__(self, seconds, expires_at=None):
+        self.expires_at = expires_at if expires_at is not None else time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def reserve(self, seconds):
+        """Deadline that ends `seconds` before this one"""
+        return Deadline(0, expires_at=self.expires_at - seconds)
+
+    def cap(self, seconds):
+        """`seconds` limited to the remaining budget; raises when nothing is left"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("request deadline exceeded")
+        return min(seconds, remaining)
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.2f}s)"
@@ -0,0 +1,232 @@
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from Backend.flow_control import AIMDLimiter, CircuitBreaker, Upstream, UpstreamUnavailable, DeadlineExceeded
+from Backend.pipeline import StageTimings
+
+# (connect, read) timeouts in seconds per pipeline stage
+STAGE_TIMEOUTS = {
+    "embedding": (3.05, 10),
+    # Bulk requests of many inputs: not hedged, timed apart from single queries
+    "embedding_batch": (3.05, 30),
+    "rewrite": (3.05, 10),
+    "metadata": (3.05, 10),
+    "rewrite_metadata": (3.05, 12),
+    "sql": (3.05, 20),
+    "order": (3.05, 10),
+    "final": (3.05, 30),
+}
+DEFAULT_TIMEOUT = (3.05, 30)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+
+OVERLOAD_STATUSES = {429, 503}
+
+# Stages that have a local fallback: they never queue behind a saturated upstream
+DEGRADABLE_STAGES = {"rewrite", "metadata", "rewrite_metadata"}
+QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "5"))
+
+
+def build_upstream(name):
+    prefix = f"UPSTREAM_{name.upper()}"
+    return Upstream(
+        name,
+        limiter=AIMDLimiter(
+            initial=int(os.getenv(f"{prefix}_CONCURRENCY", "8")),
+            maximum=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", "64")),
+        ),
+        breaker=CircuitBreaker(
+            threshold=int(os.getenv(f"{prefix}_BREAKER_THRESHOLD", "5")),
+            cooldown=float(os.getenv(f"{prefix}_BREAKER_COOLDOWN", "10")),
+        ),
+    )
+
+
+upstreams = {"chat": build_upstream("chat"), "embedding": build_upstream("embedding")}
+
+
+# Idempotent, latency-critical stages: a duplicate is sent once the first
+# attempt outlives the stage's observed p95 upstream latency
+HEDGED_STAGES = set(filter(None, os.getenv("HEDGED_STAGES", "embedding,sql").split(",")))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_QUANTILE = 0.95
+hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HEDGE_WORKERS", "16")), thread_name_prefix="hedge")
+call_timings = StageTimings()
+hedge_counts = {"hedged": 0, "hedge_won": 0}
+hedge_lock = threading.Lock()
+
+
+def count_hedge(key):
+    with hedge_lock:
+        hedge_counts[key] += 1
+
+
+EMBEDDING_STAGES = {"embedding", "embedding_batch"}
+
+
+def upstream_for(stage):
+    return upstreams["embedding" if stage in EMBEDDING_STAGES else "chat"]
+
+
+def upstream_stats():
+    return {
+        **{name: upstream.stats() for name, upstream in upstreams.items()},
+        "latency": call_timings.stats(),
+        "hedging": dict(hedge_counts),
+    }
+
+
+def build_session(pool_size=POOL_SIZE):
+    """Keep-alive session whose connection pool is shared by every upstream call"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+session = build_session()
+
+
+def stage_timeout(stage):
+    """Timeout for a stage; HTTP_TIMEOUT_<STAGE>=connect,read overrides the default"""
+    override = os.getenv(f"HTTP_TIMEOUT_{(stage or '').upper()}")
+    if override:
+        connect, read = (float(part) for part in override.split(","))
+        return connect, read
+    return STAGE_TIMEOUTS.get(stage, DEFAULT_TIMEOUT)
+
+
+def retry_after_seconds(response):
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP date), or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def backoff_seconds(attempt):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def post_json(url, headers, payload, stage=None, timeout=None, max_retries=None, stream=False,
+              queue_timeout=None, deadline=None):
+    """
+    POST through the shared pooled session with per-stage timeouts. 429 and
+    5xx responses and connection failures are retried with jittered backoff,
+    honouring Retry-After. Returns the last requests.Response.
+
+    Every attempt is admitted by the upstream's adaptive concurrency limit
+    and circuit breaker; UpstreamUnavailable is raised without a network
+    call when the breaker is open or no slot frees up within the queue
+    timeout. Stages that have a fallback neither queue nor retry.
+
+    With a `deadline`, read timeouts, queueing and backoff are capped by the
+    remaining request budget (DeadlineExceeded once it is spent). Calls of
+    HEDGED_STAGES send a duplicate after the stage's p95 latency and return
+    whichever answers first.
+    """
+    degradable = stage in DEGRADABLE_STAGES
+    options = {
+        "stage": stage,
+        "timeout": timeout or stage_timeout(stage),
+        "max_retries": max_retries if max_retries is not None else (0 if degradable else MAX_RETRIES),
+        "stream": stream,
+        "queue_timeout": queue_timeout if queue_timeout is not None else (0 if degradable else QUEUE_TIMEOUT),
+        "deadline": deadline,
+    }
+    hedge_after = call_timings.percentile(stage, HEDGE_QUANTILE, min_samples=HEDGE_MIN_SAMPLES)
+    if stream or stage not in HEDGED_STAGES or hedge_after is None:
+        return send_with_retries(url, headers, payload, **options)
+    return send_hedged(url, headers, payload, hedge_after, options)
+
+
+def send_hedged(url, headers, payload, hedge_after, options):
+    """Primary attempt, plus one duplicate if it has not answered after `hedge_after` seconds"""
+    primary = hedge_executor.submit(send_with_retries, url, headers, payload, **options)
+    done, _ = wait([primary], timeout=hedge_after)
+    deadline = options["deadline"]
+    if done or (deadline is not None and deadline.remaining() <= hedge_after):
+        return primary.result()
+
+    # The duplicate never queues or retries: it only helps when there is spare capacity
+    hedge_options = {**options, "queue_timeout": 0, "max_retries": 0}
+    hedge = hedge_executor.submit(send_with_retries, url, headers, payload, **hedge_options)
+    count_hedge("hedged")
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None and future.result().status_code not in RETRY_STATUSES:
+                if future is hedge:
+                    count_hedge("hedge_won")
+                return future.result()
+    # Both failed: surface the primary's outcome
+    return primary.result()
+
+
+def send_with_retries(url, headers, payload, stage=None, timeout=None, max_retries=MAX_RETRIES, stream=False,
+                      queue_timeout=QUEUE_TIMEOUT, deadline=None):
+    upstream = upstream_for(stage)
+    connect_timeout, read_timeout = timeout
+    attempt = 0
+    while True:
+        if deadline is not None:
+            attempt_timeout = (deadline.cap(connect_timeout), deadline.cap(read_timeout))
+            upstream.acquire(min(queue_timeout, deadline.remaining()))
+        else:
+            attempt_timeout = timeout
+            upstream.acquire(queue_timeout)
+        start = time.perf_counter()
+        try:
+            # The slot covers the time to response headers; a streamed body
+            # is read after release
+            response = session.post(url, headers=headers, json=payload, timeout=attempt_timeout, stream=stream)
+        except requests.ConnectionError as e:
+            upstream.release(success=False)
+            # Covers ConnectTimeout; a ReadTimeout is not retried so a slow
+            # upstream cannot multiply the stage's latency
+            delay = backoff_seconds(attempt)
+            if attempt >= max_retries or (deadline is not None and delay >= deadline.remaining()):
+                raise
+            print(f"DEBUG: {stage or 'http'} connection error, retrying in {delay:.2f}s: {e}")
+        except requests.Timeout:
+            upstream.release(success=False, overloaded=True)
+            raise
+        except BaseException:
+            # Not an upstream health signal (bad URL, interrupted worker, ...)
+            upstream.release(success=True)
+            raise
+        else:
+            failed = response.status_code in RETRY_STATUSES
+            upstream.release(success=not failed, overloaded=response.status_code in OVERLOAD_STATUSES)
+            if not failed:
+                call_timings.record(stage, time.perf_counter() - start)
+            if not failed or attempt >= max_retries:
+                return response
+            delay = retry_after_seconds(response)
+            delay = backoff_seconds(attempt) if delay is None else min(delay, BACKOFF_MAX)
+            if deadline is not None and delay >= deadline.remaining():
+                # No budget left for another attempt
+                return response
+            print(f"DEBUG: {stage or 'http'} got {response.status_code}, retrying in {delay:.2f}s")
+            response.close()
+        time.sleep(delay)
+        attempt += 1
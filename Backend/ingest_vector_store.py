@@ -0,0 +1,294 @@
+"""
+Build vector_store from the product, dealer, warehouse, sales, claim and
+inventory tables.
+
+Source rows are streamed through server-side cursors, rendered to text plus
+metadata, embedded in batches and bulk-upserted on `source_key`. Rows whose
+content hash is unchanged are skipped, and progress is checkpointed per
+source so an interrupted run picks up where it stopped.
+
+    python -m Backend.ingest_vector_store                  # all sources
+    python -m Backend.ingest_vector_store --sources sales claim --prune
+"""
+import os
+import json
+import time
+import argparse
+import hashlib
+from datetime import date, datetime
+from decimal import Decimal
+import psycopg2
+from psycopg2.extras import execute_values
+from Backend.rag import get_embeddings, EMBEDDING_MODEL_VERSION
+
+CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", ".cache/ingest_checkpoint.json")
+
+# name -> (key columns, SELECT producing one vector_store row per source row)
+SOURCES = {
+    "product": (["product_id"], """
+        SELECT p.product_id, p.product_name, p.category, p.price AS product_price,
+               p.section_width, p.aspect_ratio, p.construction_type, p.rim_diameter_inch
+        FROM product p
+    """),
+    "dealer": (["dealer_id"], """
+        SELECT d.dealer_id, d.name AS dealer_name
+        FROM dealer d
+    """),
+    "warehouse": (["warehouse_id"], """
+        SELECT w.warehouse_id, w.location, w.zone
+        FROM warehouse w
+    """),
+    "inventory": (["product_id", "warehouse_id"], """
+        SELECT i.product_id, p.product_name, i.warehouse_id, w.location, w.zone, i.quantity
+        FROM inventory i
+        JOIN product p ON i.product_id = p.product_id
+        JOIN warehouse w ON i.warehouse_id = w.warehouse_id
+    """),
+    "sales": (["sales_id"], """
+        SELECT s.sales_id, s.dealer_id, d.name AS dealer_name, s.product_id, p.product_name,
+               s.warehouse_id, w.location, w.zone, s.quantity, s.cost, s.date
+        FROM sales s
+        JOIN dealer d ON s.dealer_id = d.dealer_id
+        JOIN product p ON s.product_id = p.product_id
+        JOIN warehouse w ON s.warehouse_id = w.warehouse_id
+    """),
+    "claim": (["claim_id"], """
+        SELECT c.*, d.name AS dealer_name
+        FROM claim c
+        JOIN dealer d ON c.dealer_id = d.dealer_id
+    """),
+}
+
+
+def get_connection():
+    return psycopg2.connect(
+        dbname=os.getenv("dbname"),
+        user=os.getenv("user"),
+        password=os.getenv("password"),
+        host=os.getenv("host"),
+        port=os.getenv("port")
+    )
+
+
+def json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def render_row(source, record):
+    """
+    Text and metadata for one source row. Metadata keys use the field names
+    extract_metadata_with_llm produces, so metadata filters match them.
+    """
+    metadata = {key: json_value(value) for key, value in record.items() if value is not None}
+    metadata["source"] = source
+    lines = [f"{source.title()} record"]
+    lines += [f"{key}: {value}" for key, value in metadata.items() if key != "source"]
+    return "\n".join(lines), metadata
+
+
+def source_key(source, key_columns, record):
+    return f"{source}:" + ":".join(str(record[column]) for column in key_columns)
+
+
+def content_hash(text, metadata):
+    payload = json.dumps({"text": text, "metadata": metadata, "model": EMBEDDING_MODEL_VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def ensure_schema(conn):
+    """Columns the pipeline and the index delta sync rely on"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            ALTER TABLE vector_store
+                ADD COLUMN IF NOT EXISTS content text,
+                ADD COLUMN IF NOT EXISTS source_key text,
+                ADD COLUMN IF NOT EXISTS content_hash text,
+                ADD COLUMN IF NOT EXISTS updated_at timestamptz DEFAULT now(),
+                ADD COLUMN IF NOT EXISTS is_deleted boolean DEFAULT false
+        """)
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS vector_store_source_key ON vector_store (source_key)")
+        cur.execute("CREATE INDEX IF NOT EXISTS vector_store_updated_at ON vector_store (updated_at)")
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'vector_store'
+        """)
+        columns = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return columns
+
+
+def existing_hashes(conn, source):
+    """source_key -> content_hash for live rows already ingested from `source`"""
+    with conn.cursor(name=f"hashes_{source}") as cur:
+        cur.itersize = 10000
+        cur.execute("""
+            SELECT source_key, content_hash FROM vector_store
+            WHERE source_key LIKE %s AND NOT coalesce(is_deleted, false)
+        """, (f"{source}:%",))
+        return {key: digest for key, digest in cur}
+
+
+def upsert_rows(conn, rows, with_vector_column):
+    """Bulk upsert (source_key, content, metadata, embedding, content_hash) tuples"""
+    columns = "source_key, content, metadata, embedding, content_hash, updated_at, is_deleted"
+    template = "(%s, %s, %s, %s, %s, now(), false)"
+    updates = """
+        content = EXCLUDED.content,
+        metadata = EXCLUDED.metadata,
+        embedding = EXCLUDED.embedding,
+        content_hash = EXCLUDED.content_hash,
+        updated_at = now(),
+        is_deleted = false
+    """
+    if with_vector_column:
+        columns += ", embedding_vec"
+        template = "(%s, %s, %s, %s, %s, now(), false, %s::vector)"
+        updates += ", embedding_vec = EXCLUDED.embedding_vec"
+        rows = [row + (row[3],) for row in rows]
+    with conn.cursor() as cur:
+        execute_values(cur, f"""
+            INSERT INTO vector_store ({columns}) VALUES %s
+            ON CONFLICT (source_key) DO UPDATE SET {updates}
+        """, rows, template=template)
+    conn.commit()
+
+
+def mark_deleted(conn, keys):
+    """Tombstone rows whose source row no longer exists"""
+    keys = list(keys)
+    for start in range(0, len(keys), 1000):
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE vector_store SET is_deleted = true, updated_at = now()
+                WHERE source_key = ANY(%s)
+            """, (keys[start:start + 1000],))
+        conn.commit()
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_checkpoint(path, checkpoint):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f, default=str)
+    os.replace(path + ".tmp", path)
+
+
+def ingest_source(conn, source, columns, batch_size=256, checkpoint=None, checkpoint_path=CHECKPOINT_PATH,
+                  prune=False):
+    """Stream one source table into vector_store; returns (rows read, rows embedded, seconds)"""
+    key_columns, select_sql = SOURCES[source]
+    known = existing_hashes(conn, source)
+    resume_after = (checkpoint or {}).get(source)
+    seen = set()
+    read = embedded = 0
+    start = time.perf_counter()
+
+    query = f"SELECT * FROM ({select_sql}) src"
+    params = ()
+    if resume_after:
+        placeholders = ", ".join(["%s"] * len(key_columns))
+        query += f" WHERE ({', '.join(key_columns)}) > ({placeholders})"
+        params = tuple(resume_after)
+        print(f"DEBUG: Resuming {source} after {resume_after}")
+    query += f" ORDER BY {', '.join(key_columns)}"
+
+    # WITH HOLD keeps the server-side cursor open across the per-batch commits
+    with conn.cursor(name=f"ingest_{source}", withhold=True) as cur:
+        cur.itersize = batch_size * 4
+        cur.execute(query, params)
+        names = None
+        while True:
+            records = cur.fetchmany(batch_size)
+            if not records:
+                break
+            names = names or [desc[0] for desc in cur.description]
+            batch = []
+            for values in records:
+                record = dict(zip(names, values))
+                key = source_key(source, key_columns, record)
+                text, metadata = render_row(source, record)
+                digest = content_hash(text, metadata)
+                seen.add(key)
+                if known.get(key) != digest:
+                    batch.append((key, text, metadata, digest))
+            read += len(records)
+
+            if batch:
+                vectors, errors = get_embeddings([text for _, text, _, _ in batch], cache=False)
+                rows = [
+                    (key, text, json.dumps(metadata), json.dumps(vector), digest)
+                    for (key, text, metadata, digest), vector in zip(batch, vectors)
+                    if vector is not None
+                ]
+                for (key, *_), error in zip(batch, errors):
+                    if error:
+                        print(f"DEBUG: Skipping {key}: {error}")
+                if rows:
+                    upsert_rows(conn, rows, "embedding_vec" in columns)
+                embedded += len(rows)
+
+            last = dict(zip(names, records[-1]))
+            if checkpoint is not None:
+                checkpoint[source] = [json_value(last[column]) for column in key_columns]
+                save_checkpoint(checkpoint_path, checkpoint)
+            elapsed = time.perf_counter() - start
+            print(f"DEBUG: {source}: {read} read, {embedded} embedded, {read / max(elapsed, 1e-9):.0f} rows/s")
+
+    if prune and not resume_after:
+        stale = set(known) - seen
+        if stale:
+            mark_deleted(conn, stale)
+            print(f"DEBUG: {source}: marked {len(stale)} removed rows deleted")
+    if checkpoint is not None:
+        checkpoint.pop(source, None)
+        save_checkpoint(checkpoint_path, checkpoint)
+    return read, embedded, time.perf_counter() - start
+
+
+def ingest(sources=None, batch_size=256, restart=False, prune=False, checkpoint_path=CHECKPOINT_PATH):
+    sources = sources or list(SOURCES)
+    checkpoint = {} if restart else load_checkpoint(checkpoint_path)
+    conn = get_connection()
+    try:
+        columns = ensure_schema(conn)
+        total_read = total_embedded = 0
+        total_start = time.perf_counter()
+        for source in sources:
+            read, embedded, elapsed = ingest_source(
+                conn, source, columns, batch_size=batch_size, checkpoint=checkpoint,
+                checkpoint_path=checkpoint_path, prune=prune
+            )
+            total_read += read
+            total_embedded += embedded
+            print(f"✅ {source}: {read} rows, {embedded} embedded, {read - embedded} unchanged "
+                  f"in {elapsed:.1f}s ({read / max(elapsed, 1e-9):.0f} rows/s)")
+        elapsed = time.perf_counter() - total_start
+        print(f"✅ Ingestion complete: {total_read} rows, {total_embedded} embedded in {elapsed:.1f}s "
+              f"({total_read / max(elapsed, 1e-9):.0f} rows/s)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build vector_store from the source tables")
+    parser.add_argument("--sources", nargs="+", choices=list(SOURCES), help="default: all sources")
+    parser.add_argument("--batch-size", type=int, default=256, help="rows read and embedded per batch")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--prune", action="store_true", help="tombstone rows whose source row is gone")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    args = parser.parse_args()
+    ingest(args.sources, batch_size=args.batch_size, restart=args.restart, prune=args.prune,
+           checkpoint_path=args.checkpoint)
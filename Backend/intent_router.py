@@ -0,0 +1,145 @@
+"""
+Local order / info intent classifier for sales-rep queries.
+
+Three signals are combined as log-odds of the query being an order:
+keyword rules, entity presence (quantities, known products and dealers),
+and a multinomial naive Bayes model trained on past conversation_logs,
+labelled by whether the logged response came from the order path. The
+caller consults the LLM only when the combined probability falls between
+the two confidence thresholds.
+"""
+import re
+import math
+from collections import Counter
+
+ORDER_VERBS = re.compile(r"\b(order|place|buy|purchase|book|reserve|dispatch|ship)\b")
+QUESTION_START = re.compile(
+    r"^\s*(what|how|which|who|when|where|why|show|list|give|tell|is|are|do|does|did|can|could|check|compare|find|display)\b"
+)
+INFO_WORDS = re.compile(
+    r"\b(stock|available|availability|inventory|price|prices|claims?|sales|status|total|history|details|report|sold|pending)\b"
+)
+# Requests about an order that already exists: "cancel order 55", "status of order 55"
+ORDER_LOOKUP = re.compile(r"\b(cancel\w*|status|track\w*|refund\w*|return|modify|amend|invoice)\b")
+QUANTITY = re.compile(r"\b(\d+)\s*(units?|pcs|pieces|tyres?|tires?|nos|qty)\b|\b(?:order|place|buy|purchase|need)\s+(\d+)\b")
+TOKEN = re.compile(r"[a-z0-9/]+")
+
+# Responses written by the order path in conversation_logs
+ORDER_RESPONSE_PREFIXES = ("✅ Order placed", "❌ Order failed", "❌ Missing order details", "✅ Order")
+
+ORDER_THRESHOLD = 0.9
+INFO_THRESHOLD = 0.1
+
+
+def sigmoid(x):
+    return 1 / (1 + math.exp(-max(min(x, 50), -50)))
+
+
+def features(text):
+    tokens = TOKEN.findall(text.lower())
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def label_from_response(ai_response):
+    return "order" if str(ai_response or "").startswith(ORDER_RESPONSE_PREFIXES) else "info"
+
+
+class NaiveBayesIntentModel:
+    """Multinomial naive Bayes over unigrams + bigrams with Laplace smoothing"""
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+        self.counts = {"order": Counter(), "info": Counter()}
+        self.docs = Counter()
+        self.totals = Counter()
+        self.vocab = set()
+
+    def fit(self, examples):
+        """examples: iterable of (text, label) with label "order" or "info" """
+        for text, label in examples:
+            tokens = features(text)
+            self.counts[label].update(tokens)
+            self.totals[label] += len(tokens)
+            self.docs[label] += 1
+            self.vocab.update(tokens)
+        return self
+
+    def is_trained(self, min_per_class=5):
+        return all(self.docs[label] >= min_per_class for label in ("order", "info"))
+
+    def log_odds(self, text):
+        """log P(order | text) - log P(info | text)"""
+        size = len(self.vocab) + 1
+        score = math.log((self.docs["order"] + 1) / (self.docs["info"] + 1))
+        for token in features(text):
+            if token not in self.vocab:
+                continue
+            p_order = (self.counts["order"][token] + self.alpha) / (self.totals["order"] + self.alpha * size)
+            p_info = (self.counts["info"][token] + self.alpha) / (self.totals["info"] + self.alpha * size)
+            score += math.log(p_order / p_info)
+        return score
+
+
+def rule_log_odds(text, keyword_intent=None, has_product=False, has_dealer=False):
+    """Log-odds contribution of keywords and entity presence"""
+    lowered = text.lower()
+    score = -1.0  # most sales-rep traffic is informational
+    # With a lookup word, "order" is a noun and the number after it an order id
+    lookup = bool(ORDER_LOOKUP.search(lowered))
+    order_verb = bool(ORDER_VERBS.search(lowered)) and not lookup
+    quantity = any(match.group(1) or not lookup for match in QUANTITY.finditer(lowered))
+
+    if order_verb:
+        score += 2.0
+    elif keyword_intent == "order":
+        score += 0.5
+    if keyword_intent == "stock_check" and not order_verb:
+        score -= 1.5
+    if QUESTION_START.search(lowered) or lowered.rstrip().endswith("?"):
+        score -= 2.5
+    if INFO_WORDS.search(lowered) and not order_verb:
+        score -= 1.5
+    if lookup:
+        score -= 2.0
+    if quantity:
+        score += 1.5
+    elif not order_verb:
+        score -= 1.5
+    if has_product:
+        score += 0.5
+    if has_dealer and order_verb:
+        score += 0.5
+    return score
+
+
+class IntentRouter:
+    """Combines rules, entities and the optional trained model into P(order)"""
+
+    def __init__(self, model=None, order_threshold=ORDER_THRESHOLD, info_threshold=INFO_THRESHOLD):
+        self.model = model if model is not None and model.is_trained() else None
+        self.order_threshold = order_threshold
+        self.info_threshold = info_threshold
+
+    @classmethod
+    def from_logs(cls, rows, **kwargs):
+        """Train on conversation_logs rows carrying user_query and ai_response"""
+        examples = [
+            (row["user_query"], label_from_response(row.get("ai_response")))
+            for row in rows if row.get("user_query")
+        ]
+        return cls(NaiveBayesIntentModel().fit(examples), **kwargs)
+
+    def probability(self, text, keyword_intent=None, has_product=False, has_dealer=False):
+        score = rule_log_odds(text, keyword_intent, has_product, has_dealer)
+        if self.model is not None:
+            score += self.model.log_odds(text)
+        return sigmoid(score)
+
+    def classify(self, text, **signals):
+        """("order" | "info" | None when uncertain, P(order))"""
+        p = self.probability(text, **signals)
+        if p >= self.order_threshold:
+            return "order", p
+        if p <= self.info_threshold:
+            return "info", p
+        return None, p
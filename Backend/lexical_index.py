@@ -0,0 +1,139 @@
+import re
+import math
+from collections import Counter, defaultdict
+import numpy as np
+
+# Keeps tyre sizes and SKUs like 100/35R24 or 205-55-r16 together as one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[/.\-][a-z0-9]+)*")
+# Bookkeeping columns that carry no searchable text
+SKIP_FIELDS = {"id", "embedding", "embedding_vec", "updated_at", "created_at", "is_deleted", "deleted_at",
+               "content_hash"}
+
+
+def tokenize(text):
+    """Lowercased word tokens; compound identifiers also yield their parts"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(str(text).lower()):
+        tokens.append(token)
+        parts = re.split(r"[/.\-]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+def row_text(row):
+    """Searchable text of a vector_store row: every value except bookkeeping columns"""
+    values = []
+
+    def collect(value):
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                if key not in SKIP_FIELDS:
+                    collect(inner)
+        elif isinstance(value, (list, tuple)):
+            for inner in value:
+                collect(inner)
+        elif value is not None:
+            values.append(str(value))
+
+    collect(row)
+    return " ".join(values)
+
+
+def is_identifier_token(token):
+    """Tokens mixing digits with letters or separators (SKUs, sizes, ids)"""
+    return any(c.isdigit() for c in token) and (any(c.isalpha() for c in token) or any(c in "/.-" for c in token))
+
+
+def key_terms(text):
+    """Identifier and number tokens of a question (SKUs, sizes, ids, quantities), sorted"""
+    return tuple(sorted({token for token in TOKEN_PATTERN.findall(str(text).lower())
+                         if token.isdigit() or is_identifier_token(token)}))
+
+
+def bm25_idf(num_docs, doc_freq):
+    return math.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over the text of vector_store rows.
+
+    Postings hold the per-document BM25 term-frequency weights, computed at
+    build time; idf is applied at query time so several indexes over
+    consecutive position ranges (segments, see search_segments) can be
+    scored with their combined document frequencies. `offset` is the
+    position of the first row, `avg_length` pins length normalisation to
+    another segment's average document length.
+    """
+
+    def __init__(self, rows, metadata=None, k1=1.2, b=0.75, offset=0, avg_length=None):
+        self.offset = offset
+        self.size = len(rows)
+        postings = defaultdict(list)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for pos, row in enumerate(rows):
+            if row is None:
+                continue
+            meta = metadata[pos] if metadata is not None else None
+            tokens = tokenize(row_text({**row, "metadata": meta} if meta is not None else row))
+            lengths[pos] = len(tokens)
+            for token, tf in Counter(tokens).items():
+                postings[token].append((pos, tf))
+
+        live = lengths > 0
+        self.num_docs = int(live.sum())
+        self.avg_length = avg_length or (float(lengths[live].mean()) if live.any() else 1.0)
+        self.postings = {}
+        for token, entries in postings.items():
+            positions = np.array([pos for pos, _ in entries], dtype=np.int64)
+            tf = np.array([tf for _, tf in entries], dtype=np.float32)
+            norm = k1 * (1 - b + b * lengths[positions] / self.avg_length)
+            self.postings[token] = (positions + offset, (tf * (k1 + 1) / (tf + norm)).astype(np.float32))
+
+    def search(self, query, top_k=10, positions=None):
+        """BM25 top-k as (score, position) pairs, optionally restricted to `positions`"""
+        return search_segments([self], query, top_k=top_k, positions=positions)
+
+    def has_identifier_hit(self, query):
+        """True if an identifier-looking token in the query occurs in the index"""
+        return any(is_identifier_token(t) and t in self.postings for t in tokenize(query))
+
+
+def search_segments(segments, query, top_k=10, positions=None, alive=None):
+    """
+    BM25 top-k as (score, position) pairs over BM25Index segments covering
+    disjoint position ranges. idf uses the document frequencies summed over
+    every segment; positions where `alive` is False never match.
+    """
+    terms = set(tokenize(query))
+    size = max((segment.offset + segment.size for segment in segments), default=0)
+    num_docs = max(sum(segment.num_docs for segment in segments), 1)
+    scores = np.zeros(size, dtype=np.float32)
+    for term in terms:
+        entries = [segment.postings[term] for segment in segments if term in segment.postings]
+        if not entries:
+            continue
+        idf = bm25_idf(num_docs, sum(entry[0].size for entry in entries))
+        for entry_positions, weights in entries:
+            scores[entry_positions] += idf * weights
+    if positions is not None:
+        allowed = np.zeros(size, dtype=bool)
+        allowed[positions] = True
+        scores[~allowed] = 0
+    if alive is not None:
+        scores[~alive[:size]] = 0
+    hits = np.flatnonzero(scores)
+    if hits.size == 0:
+        return []
+    order = hits[np.argsort(-scores[hits], kind="stable")[:top_k]]
+    return [(float(scores[pos]), int(pos)) for pos in order]
+
+
+def reciprocal_rank_fusion(rankings, k=60, top_k=10):
+    """Fuse ranked position lists: score = sum of 1 / (k + rank) over the lists"""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, pos in enumerate(ranking, 1):
+            fused[pos] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
@@ -2,7 +2,7 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from Backend.supabase_client import supabase  # ✅ import your Supabase client
-from Backend.rag import authenticate_user, current_user, process_user_query  # Import your RAG logic
+from Backend.rag import authenticate_user, process_user_query  # Import your RAG logic
 from Backend.rag import UserSession 
 app = FastAPI()
 
@@ -100,10 +100,7 @@ async def query(request: Request):
 
         print(f"✅ [DEBUG] User session retrieved: {user_session.username}, Role: {user_session.role}, Dealer ID: {user_session.dealer_id}")
 
-        # Step 2: Set current_user globally for use in rag logic
-        global current_user
-        current_user = user_session
-
+        # Step 2: process_user_query sets the request's user for the rag logic
         # Step 3: Process the query
         print("🧠 [DEBUG] Passing query to process_user_query()...")
         answer = process_user_query(user_query, user_session)
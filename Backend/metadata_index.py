@@ -0,0 +1,116 @@
+from collections import defaultdict
+from fuzzywuzzy import fuzz
+
+# Identifier-like fields: looked up in the exact posting lists. Numeric ids
+# match exactly only; string ids (product SKUs) and categories fall back to a
+# substring scan when the exact lookup is empty
+EXACT_FIELDS = {
+    "dealer_id", "product_id", "warehouse_id", "zone", "sales_id", "claim_id",
+    "user_id", "status", "category",
+}
+
+# Rows carrying one of these keys are private to the dealer_id they hold
+PRIVATE_KEYS = ("sales_id", "claim_id")
+
+FUZZY_THRESHOLD = 70
+PARTIAL_SCORE = 0.7
+
+
+def value_key(value):
+    return str(value).lower()
+
+
+def is_numeric(value):
+    return isinstance(value, (int, float)) or (isinstance(value, str) and value.strip().isdigit())
+
+
+class MetadataIndex:
+    """
+    Inverted index over vector_store row metadata.
+
+    Every field maps its distinct values to posting lists of row positions.
+    A metadata filter is resolved by looking values up (exact fields, with a
+    substring scan for partial string ids such as "100/35R24") or by
+    fuzzy-matching against the distinct values of a field (string fields such
+    as dealer_name and location), so the cost depends on the number of
+    distinct values and matches rather than on the number of rows.
+
+    Scores follow enhanced_metadata_filter_matching: 1 for an exact match,
+    ratio/100 for a fuzzy string match, 0.7 for a partial match, averaged
+    over the filter keys.
+
+    `offset` is the position of the first entry of `metadata`, so an index
+    can cover one segment of a larger position range.
+    """
+
+    def __init__(self, metadata, offset=0):
+        # field -> value_key -> positions
+        self.postings = defaultdict(lambda: defaultdict(list))
+        # field -> value_key -> (original value, is_str)
+        self.values = defaultdict(dict)
+        # position -> dealer_id for dealer-private (sales / claim) rows
+        self.private_owner = {}
+
+        for pos, meta in enumerate(metadata, offset):
+            if not meta:
+                continue
+            for field, value in meta.items():
+                if not value or isinstance(value, (dict, list)):
+                    continue
+                key = value_key(value)
+                self.postings[field][key].append(pos)
+                self.values[field].setdefault(key, (value, isinstance(value, str)))
+            if "dealer_id" in meta and any(k in meta for k in PRIVATE_KEYS):
+                self.private_owner[pos] = str(meta["dealer_id"])
+
+    def field_scores(self, field, filter_value):
+        """Yield (score, positions) for the values of `field` matching filter_value"""
+        postings = self.postings.get(field)
+        if not postings:
+            return
+        filter_key = value_key(filter_value)
+
+        exact = postings.get(filter_key)
+        if exact:
+            yield 1.0, exact
+        if field in EXACT_FIELDS:
+            if not exact and not is_numeric(filter_value):
+                for key, (_, is_str) in self.values[field].items():
+                    if is_str and (filter_key in key or key in filter_key):
+                        yield PARTIAL_SCORE, postings[key]
+            return
+
+        filter_is_str = isinstance(filter_value, str)
+        for key, (value, is_str) in self.values[field].items():
+            if key == filter_key:
+                continue
+            if filter_is_str and is_str:
+                similarity = fuzz.ratio(filter_key, key)
+                if similarity >= FUZZY_THRESHOLD:
+                    yield similarity / 100, postings[key]
+            elif filter_key in key or key in filter_key:
+                yield PARTIAL_SCORE, postings[key]
+
+    def match(self, metadata_filter, min_score=0.3):
+        """
+        Resolve a metadata filter to {position: score} for rows scoring at
+        least min_score. Dealer access is enforced by the caller through the
+        index partitions, not here.
+        """
+        if not metadata_filter:
+            return {}
+        total_filters = len(metadata_filter)
+        scores = defaultdict(float)
+        for field, filter_value in metadata_filter.items():
+            if not filter_value or isinstance(filter_value, (dict, list)):
+                continue
+            for score, positions in self.field_scores(field, filter_value):
+                for pos in positions:
+                    scores[pos] += score
+
+        matches = {}
+        for pos, score in scores.items():
+            score /= total_filters
+            if score >= min_score:
+                matches[pos] = score
+        return matches
@@ -0,0 +1,193 @@
+"""
+Deterministic parser for well-formed order commands such as
+
+    Order 50 units of 100/35R24 50P for dealer 123
+    Place 3 SpeedoCruze Pro for Pooja Singh from warehouse 2
+
+Products, dealers and warehouses are recognised against an index of the
+cached database entities. Every recognised part adds to a confidence
+score; anything the parser cannot account for lowers it, so unusual
+phrasings fall back to the LLM extractor.
+"""
+import re
+
+TOKEN = re.compile(r"[a-z0-9]+(?:[/.\-][a-z0-9]+)*")
+
+ORDER_VERB = re.compile(
+    r"^(?:please\s+)?(?:place\s+(?:an?\s+)?order\s+(?:for|of)?|order|place|buy|purchase|book|reserve|need|send)\b"
+)
+DEALER_ID = re.compile(r"\bdealer\s*(?:id\s*)?#?\s*(\d+)\b")
+WAREHOUSE_ID = re.compile(r"\bwarehouse\s*(?:id\s*)?#?\s*(\d+)\b")
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+SIGNS = ("-", "+", "\u2212")
+
+# Words that carry no order information of their own
+FILLER = {
+    "please", "place", "an", "a", "order", "orders", "buy", "purchase", "book", "reserve", "need", "send",
+    "units", "unit", "pcs", "pieces", "nos", "qty", "tyres", "tyre", "tires", "tire", "of", "for",
+    "to", "from", "the", "dealer", "id", "warehouse", "at", "in", "and", "with", "me",
+}
+
+MIN_CONFIDENCE = 0.9
+
+
+def tokens_of(text):
+    return TOKEN.findall(str(text).lower())
+
+
+class PhraseIndex:
+    """Token-sequence index: finds the longest known phrase starting at each query token"""
+
+    def __init__(self, phrases):
+        # first token -> [(tokens, value)] longest first
+        self.starts = {}
+        for phrase, value in phrases:
+            tokens = tuple(tokens_of(phrase))
+            if tokens:
+                self.starts.setdefault(tokens[0], []).append((tokens, value))
+        for entries in self.starts.values():
+            entries.sort(key=lambda entry: len(entry[0]), reverse=True)
+
+    def find(self, tokens, skip=()):
+        """[(start, end, value)] of non-overlapping longest matches"""
+        matches, i = [], 0
+        while i < len(tokens):
+            hit = None
+            if i not in skip:
+                for phrase, value in self.starts.get(tokens[i], ()):
+                    if tuple(tokens[i:i + len(phrase)]) == phrase:
+                        hit = (i, i + len(phrase), value)
+                        break
+            if hit:
+                matches.append(hit)
+                i = hit[1]
+            else:
+                i += 1
+        return matches
+
+
+class OrderEntities:
+    """Index of products, dealers and warehouses for the order parser"""
+
+    def __init__(self, products=(), dealers=(), warehouses=()):
+        """products: (product_id, product_name); dealers: (dealer_id, name); warehouses: (warehouse_id, location)"""
+        self.product_ids = PhraseIndex((pid, pid) for pid, _ in products)
+        names = {}
+        for pid, name in products:
+            if name:
+                names.setdefault(" ".join(tokens_of(name)), set()).add(pid)
+        self.product_names = PhraseIndex((name, frozenset(ids)) for name, ids in names.items())
+
+        self.dealer_ids = {str(did) for did, _ in dealers}
+        dealer_names = {}
+        for did, name in dealers:
+            if name:
+                dealer_names.setdefault(" ".join(tokens_of(name)), set()).add(did)
+        self.dealer_names = PhraseIndex((name, frozenset(ids)) for name, ids in dealer_names.items())
+
+        self.warehouse_ids = {str(wid) for wid, _ in warehouses}
+        locations = {}
+        for wid, location in warehouses:
+            if location:
+                locations.setdefault(" ".join(tokens_of(location)), set()).add(wid)
+        self.locations = PhraseIndex((loc, frozenset(ids)) for loc, ids in locations.items())
+
+    def __bool__(self):
+        return bool(self.product_ids.starts or self.dealer_ids)
+
+
+def span_of(tokens, text_match, text):
+    """Token indexes covered by a regex match on the lowercased text"""
+    before = len(tokens_of(text[:text_match.start()]))
+    inside = len(tokens_of(text_match.group(0)))
+    return set(range(before, before + inside))
+
+
+def parse_order(text, entities):
+    """
+    Parse an order command. Returns (details, confidence) where details has
+    the shape extract_order_details returns. A confidence of MIN_CONFIDENCE
+    or more means every part of the command was recognised unambiguously.
+    Signed, zero or fractional quantities score 0 and go to the LLM.
+    """
+    lowered = " ".join(str(text).lower().split())
+    tokens = tokens_of(lowered)
+    details = {"intent": "order"}
+    if not tokens or not entities or "?" in lowered or not ORDER_VERB.search(lowered):
+        return {"intent": "unknown"}, 0.0
+    confidence = 0.25
+    covered = set()
+
+    # Explicit dealer / warehouse ids come first so their digits are not read as quantities
+    dealer_match = DEALER_ID.search(lowered)
+    if dealer_match:
+        covered |= span_of(tokens, dealer_match, lowered)
+        details["dealer_id"] = int(dealer_match.group(1))
+        confidence += 0.25 if dealer_match.group(1) in entities.dealer_ids else 0.05
+    warehouse_match = WAREHOUSE_ID.search(lowered)
+    if warehouse_match:
+        covered |= span_of(tokens, warehouse_match, lowered)
+        details["warehouse_id"] = int(warehouse_match.group(1))
+        if warehouse_match.group(1) not in entities.warehouse_ids:
+            confidence -= 0.2
+
+    product_matches = entities.product_ids.find(tokens, skip=covered)
+    if len(product_matches) == 1:
+        start, end, product_id = product_matches[0]
+        covered |= set(range(start, end))
+        details["product_id"] = product_id
+        confidence += 0.25
+    elif not product_matches:
+        name_matches = entities.product_names.find(tokens, skip=covered)
+        if len(name_matches) == 1:
+            start, end, ids = name_matches[0]
+            covered |= set(range(start, end))
+            if len(ids) == 1:
+                details["product_id"] = next(iter(ids))
+                confidence += 0.2
+            else:
+                # Several sizes share the name: leave the choice to the LLM / resolver
+                details["product_name"] = " ".join(tokens[start:end])
+                confidence += 0.05
+
+    if "dealer_id" not in details:
+        dealer_matches = entities.dealer_names.find(tokens, skip=covered)
+        if len(dealer_matches) == 1:
+            start, end, ids = dealer_matches[0]
+            covered |= set(range(start, end))
+            if len(ids) == 1:
+                details["dealer_id"] = next(iter(ids))
+                confidence += 0.2
+            else:
+                details["dealer_name"] = " ".join(tokens[start:end])
+                confidence += 0.05
+
+    if "warehouse_id" not in details:
+        location_matches = entities.locations.find(tokens, skip=covered)
+        if len(location_matches) == 1 and len(location_matches[0][2]) == 1:
+            start, end, ids = location_matches[0]
+            covered |= set(range(start, end))
+            details["warehouse_id"] = next(iter(ids))
+
+    starts = [match.start() for match in TOKEN.finditer(lowered)]
+    quantities = [
+        (i, token) for i, token in enumerate(tokens)
+        if i not in covered and NUMBER.fullmatch(token)
+    ]
+    if len(quantities) == 1:
+        i, token = quantities[0]
+        # TOKEN drops a leading sign: "order -5" must not read as 5 units
+        signed = lowered[:starts[i]].rstrip().endswith(SIGNS)
+        if signed or not token.isdigit() or int(token) == 0:
+            return details, 0.0
+        covered.add(i)
+        details["quantity"] = int(token)
+        confidence += 0.25
+    elif len(quantities) > 1:
+        confidence -= 0.3
+
+    # Words the parser could not account for (conditions, extra products, ...)
+    leftover = [t for i, t in enumerate(tokens) if i not in covered and t not in FILLER]
+    if leftover:
+        confidence -= 0.15 * len(leftover)
+    return details, round(max(0.0, min(confidence, 1.0)), 2)
@@ -0,0 +1,232 @@
+"""
+Move vector_store embeddings into a pgvector column for server-side search.
+
+Adds `embedding_vec vector(<dim>)`, converts the JSON-text `embedding`
+column into it batch by batch, builds an HNSW (or IVFFlat) cosine index and
+installs the `match_vector_store` RPC used when VECTOR_SEARCH_BACKEND=pgvector.
+The original `embedding` column is left untouched.
+
+    python -m Backend.pgvector_migration --index hnsw
+
+The RPC raises hnsw.ef_search (or sets ivfflat.probes) for its own
+transaction: the index scan yields at most ef_search candidates before the
+threshold and dealer filters, so the default of 40 would cap a 50-row
+overfetch. --verify compares the RPC against an exact scan afterwards.
+
+Checking against a local pgvector instead of Supabase:
+
+    docker run -d --name pgvector -e POSTGRES_PASSWORD=postgres -p 5433:5432 pgvector/pgvector:pg16
+    export host=localhost port=5433 dbname=postgres user=postgres password=postgres
+    python -m Backend.pgvector_migration --index hnsw --verify
+    PGVECTOR_TEST=1 python -m pytest tests/test_pgvector_migration.py
+
+The test creates and drops its own vector_store table, so point it at a
+scratch database only.
+"""
+import os
+import argparse
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+VECTOR_COLUMN = "embedding_vec"
+
+MATCH_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION match_vector_store(
+    query_embedding vector({dim}),
+    match_count int DEFAULT 10,
+    similarity_threshold float DEFAULT 0.1,
+    filter_dealer_id text DEFAULT NULL
+)
+RETURNS TABLE (row_data jsonb, similarity float)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Transaction-local: enough index candidates to survive the filters below
+    PERFORM set_config('hnsw.ef_search', least(greatest(match_count * 2, {ef_search}), 1000)::text, true);
+    PERFORM set_config('ivfflat.probes', '{probes}', true);
+    RETURN QUERY
+    SELECT
+        to_jsonb(v) - 'embedding' - '{column}' AS row_data,
+        1 - (v.{column} <=> query_embedding) AS similarity
+    FROM vector_store v
+    WHERE v.{column} IS NOT NULL
+      -- Tombstoned by delta sync or ingest --prune
+      AND NOT coalesce(v.is_deleted, false)
+      AND 1 - (v.{column} <=> query_embedding) >= similarity_threshold
+      -- Dealers never see other dealers' sales or claim rows
+      AND (
+          filter_dealer_id IS NULL
+          OR NOT (v.metadata::jsonb ? 'sales_id' OR v.metadata::jsonb ? 'claim_id')
+          OR v.metadata::jsonb ->> 'dealer_id' = filter_dealer_id
+      )
+    ORDER BY v.{column} <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
+"""
+
+# Minimum hnsw.ef_search for the RPC (pgvector's default is 40, its maximum 1000)
+DEFAULT_EF_SEARCH = 100
+# ivfflat lists probed per query; about sqrt(lists) keeps recall high
+DEFAULT_PROBES = 10
+
+
+def get_connection():
+    return psycopg2.connect(
+        dbname=os.getenv("dbname"),
+        user=os.getenv("user"),
+        password=os.getenv("password"),
+        host=os.getenv("host"),
+        port=os.getenv("port")
+    )
+
+
+def detect_dimension(cur):
+    """Embedding length, read from the first row that has one"""
+    cur.execute("""
+        SELECT json_array_length(embedding::json)
+        FROM vector_store
+        WHERE embedding IS NOT NULL
+        LIMIT 1
+    """)
+    row = cur.fetchone()
+    if not row:
+        raise Exception("vector_store has no embeddings to migrate")
+    return row[0]
+
+
+def add_vector_column(conn, dim):
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cur.execute(f"ALTER TABLE vector_store ADD COLUMN IF NOT EXISTS {VECTOR_COLUMN} vector({dim})")
+        # match_vector_store skips soft-deleted rows
+        cur.execute("ALTER TABLE vector_store ADD COLUMN IF NOT EXISTS is_deleted boolean DEFAULT false")
+    conn.commit()
+
+
+def convert_embeddings(conn, batch_size=1000):
+    """
+    Cast the JSON-text embedding into the vector column in id-ordered
+    batches, committing each one so the migration can be resumed.
+    """
+    converted = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                UPDATE vector_store
+                SET {VECTOR_COLUMN} = embedding::vector
+                WHERE id IN (
+                    SELECT id FROM vector_store
+                    WHERE {VECTOR_COLUMN} IS NULL AND embedding IS NOT NULL
+                    ORDER BY id
+                    LIMIT %s
+                )
+            """, (batch_size,))
+            updated = cur.rowcount
+        conn.commit()
+        converted += updated
+        if updated:
+            print(f"DEBUG: Converted {converted} embeddings")
+        if updated < batch_size:
+            return converted
+
+
+def create_vector_index(conn, method="hnsw", lists=100):
+    """Cosine ANN index on the vector column (hnsw, or ivfflat with `lists` lists)"""
+    with conn.cursor() as cur:
+        if method == "ivfflat":
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS vector_store_{VECTOR_COLUMN}_ivfflat
+                ON vector_store USING ivfflat ({VECTOR_COLUMN} vector_cosine_ops)
+                WITH (lists = {int(lists)})
+            """)
+        else:
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS vector_store_{VECTOR_COLUMN}_hnsw
+                ON vector_store USING hnsw ({VECTOR_COLUMN} vector_cosine_ops)
+            """)
+        cur.execute("ANALYZE vector_store")
+    conn.commit()
+
+
+def create_match_function(conn, dim, ef_search=DEFAULT_EF_SEARCH, probes=DEFAULT_PROBES):
+    with conn.cursor() as cur:
+        cur.execute(MATCH_FUNCTION_SQL.format(
+            dim=dim, column=VECTOR_COLUMN, ef_search=int(ef_search), probes=int(probes)
+        ))
+        # Let PostgREST pick up the new RPC
+        cur.execute("NOTIFY pgrst, 'reload schema'")
+    conn.commit()
+
+
+def verify_recall(conn, samples=20, match_count=50):
+    """
+    Run match_vector_store for `samples` stored embeddings and compare the
+    ids with an exact sequential scan. Returns (mean recall, mean rows
+    returned / match_count).
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT {VECTOR_COLUMN}::text FROM vector_store
+            WHERE {VECTOR_COLUMN} IS NOT NULL AND NOT coalesce(is_deleted, false)
+            ORDER BY random()
+            LIMIT %s
+        """, (samples,))
+        queries = [row[0] for row in cur.fetchall()]
+        approximate = []
+        for query in queries:
+            cur.execute("SELECT row_data ->> 'id' FROM match_vector_store(%s::vector, %s, -1, NULL)",
+                        (query, match_count))
+            approximate.append([row[0] for row in cur.fetchall()])
+        # Exact neighbours: the ANN index is ignored for the rest of the transaction
+        cur.execute("SET LOCAL enable_indexscan = off")
+        recalls, fill = [], []
+        for query, found in zip(queries, approximate):
+            cur.execute(f"""
+                SELECT id::text FROM vector_store
+                WHERE {VECTOR_COLUMN} IS NOT NULL AND NOT coalesce(is_deleted, false)
+                ORDER BY {VECTOR_COLUMN} <=> %s::vector
+                LIMIT %s
+            """, (query, match_count))
+            exact = {row[0] for row in cur.fetchall()}
+            recalls.append(len(exact & set(found)) / max(len(exact), 1))
+            fill.append(len(found) / max(len(exact), 1))
+    conn.rollback()
+    if not queries:
+        return 0.0, 0.0
+    return sum(recalls) / len(recalls), sum(fill) / len(fill)
+
+
+def migrate(method="hnsw", lists=100, batch_size=1000, ef_search=DEFAULT_EF_SEARCH, probes=DEFAULT_PROBES,
+            verify=False):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            dim = detect_dimension(cur)
+        print(f"DEBUG: Migrating vector_store embeddings (dim={dim})")
+        add_vector_column(conn, dim)
+        converted = convert_embeddings(conn, batch_size=batch_size)
+        create_vector_index(conn, method=method, lists=lists)
+        create_match_function(conn, dim, ef_search=ef_search, probes=probes)
+        print(f"✅ pgvector migration complete: {converted} rows converted, {method} index ready")
+        if verify:
+            recall, fill = verify_recall(conn)
+            print(f"match_vector_store recall@50 vs exact scan: {recall:.3f} (rows returned: {fill:.0%})")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert vector_store embeddings to pgvector")
+    parser.add_argument("--index", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--lists", type=int, default=100, help="ivfflat list count")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH,
+                        help="minimum hnsw.ef_search for the RPC (raised to 2 * match_count)")
+    parser.add_argument("--probes", type=int, default=DEFAULT_PROBES, help="ivfflat.probes for the RPC")
+    parser.add_argument("--verify", action="store_true", help="compare the RPC against an exact scan")
+    args = parser.parse_args()
+    migrate(method=args.index, lists=args.lists, batch_size=args.batch_size,
+            ef_search=args.ef_search, probes=args.probes, verify=args.verify)
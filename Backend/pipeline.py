@@ -0,0 +1,121 @@
+import time
+import threading
+import contextvars
+from collections import deque, defaultdict
+from concurrent.futures import wait, FIRST_COMPLETED
+from Backend.flow_control import DeadlineExceeded
+
+NO_FALLBACK = object()
+
+
+class StageTimings:
+    """Rolling per-stage latency window (seconds) with percentile stats"""
+
+    def __init__(self, window=500):
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.samples[stage].append(seconds)
+
+    def percentile(self, stage, q, min_samples=1):
+        with self.lock:
+            samples = sorted(self.samples.get(stage, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def stats(self):
+        with self.lock:
+            stages = {stage: sorted(samples) for stage, samples in self.samples.items()}
+        return {
+            stage: {
+                "count": len(samples),
+                "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+                "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))] * 1000, 1),
+            }
+            for stage, samples in stages.items() if samples
+        }
+
+
+class StageGraph:
+    """
+    Small dependency graph of pipeline stages.
+
+    Each stage is a callable receiving the results of its dependencies as
+    keyword arguments. run() submits every stage as soon as its
+    dependencies have finished, so independent branches overlap and the
+    wall time is the critical path rather than the sum of the stages. The
+    first stage to raise cancels whatever has not started and re-raises.
+
+    With a deadline, stages still unfinished when it passes resolve to
+    their fallback value (DeadlineExceeded if a stage has none); their
+    threads are abandoned, not waited for. `late` lists those stages after
+    the last run.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.fallbacks = {}
+        self.late = []
+
+    def add(self, name, fn, deps=(), fallback=NO_FALLBACK):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {name!r} depends on unknown stage {dep!r}")
+        self.stages[name] = (fn, tuple(deps))
+        if fallback is not NO_FALLBACK:
+            self.fallbacks[name] = fallback
+        return self
+
+    def run(self, executor, timings=None, deadline=None):
+        """
+        Execute the graph; returns (results, {stage: seconds}). Each stage
+        runs in a copy of the caller's context, so context variables (the
+        request's user) follow the stage onto the executor threads.
+        """
+        results, elapsed = {}, {}
+        self.late = []
+        pending = dict(self.stages)
+        running = {}
+
+        def timed(name, fn, kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(**kwargs)
+            finally:
+                elapsed[name] = time.perf_counter() - start
+                if timings is not None:
+                    timings.record(name, elapsed[name])
+
+        try:
+            while pending or running:
+                for name, (fn, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        kwargs = {dep: results[dep] for dep in deps}
+                        context = contextvars.copy_context()
+                        running[executor.submit(context.run, timed, name, fn, kwargs)] = name
+                        del pending[name]
+                if not running:
+                    raise RuntimeError(f"Unresolvable stages: {sorted(pending)}")
+                timeout = deadline.remaining() if deadline is not None else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+                if not done:
+                    late = sorted(set(pending) | set(running.values()))
+                    missing = [name for name in late if name not in self.fallbacks]
+                    if missing:
+                        raise DeadlineExceeded(f"Stages {missing} did not finish before the deadline")
+                    print(f"DEBUG: Deadline reached, using fallbacks for {late}")
+                    for name in late:
+                        results[name] = self.fallbacks[name]
+                    self.late = late
+                    pending.clear()
+                    running.clear()
+        finally:
+            for future in running:
+                future.cancel()
+        return results, elapsed
+
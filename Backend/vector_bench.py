@@ -0,0 +1,176 @@
+"""
+Benchmarks for the retrieval index.
+
+    python -m Backend.vector_bench recall --k 10 --queries 200
+    python -m Backend.vector_bench recall --snapshot /var/lib/wheely/vector_index
+    python -m Backend.vector_bench ann --sizes 10000 100000 1000000 --dim 256
+
+`recall` compares each storage mode against exact float32 search on the
+live vector_store (or a snapshot), using held-out stored embeddings as
+queries. `ann` reports p50/p99 latency and recall@k of IVF search at several
+nprobe settings against exact search on synthetic clustered embeddings,
+with queries drawn from the same clusters but not stored in the index.
+
+A query must never be one of the indexed rows (or a slightly perturbed
+copy): its own row is then a guaranteed nearest neighbour and inflates the
+recall of every approximate mode.
+"""
+import time
+import argparse
+import numpy as np
+from Backend.vector_index import VectorIndex, STORAGE_MODES, normalize_rows
+
+
+def recall_at_k(exact, approx, k):
+    """Mean share of the exact top-k positions that the approximate search also returned"""
+    hits = [len(set(e[:k]) & set(a[:k])) / max(min(k, len(e)), 1) for e, a in zip(exact, approx)]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def latency_percentiles(samples_ms):
+    return float(np.percentile(samples_ms, 50)), float(np.percentile(samples_ms, 99))
+
+
+def hold_out_queries(num_rows, num_queries, seed=0):
+    """(positions kept in the index, positions used as queries), disjoint"""
+    rng = np.random.default_rng(seed)
+    num_queries = min(num_queries, num_rows - 1)
+    held_out = np.zeros(num_rows, dtype=bool)
+    held_out[rng.choice(num_rows, size=num_queries, replace=False)] = True
+    return np.flatnonzero(~held_out), np.flatnonzero(held_out)
+
+
+def run_queries(index, queries, k, **search_kwargs):
+    """Top-k positions per query and per-query latency in milliseconds"""
+    results, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.search(query, top_k=k, **search_kwargs)
+        timings.append((time.perf_counter() - start) * 1000)
+        results.append([pos for _, pos in hits])
+    return results, timings
+
+
+def recall_report(index, k=10, num_queries=200, rerank=4, seed=0):
+    """
+    Recall@k, latency and scan size of every storage mode against exact
+    search; `num_queries` rows are held out of the index and used as queries.
+    """
+    keep, held_out = hold_out_queries(len(index.ids), num_queries, seed=seed)
+    queries = np.asarray(index.matrix[held_out], dtype=np.float32)
+    matrix = np.asarray(index.matrix[keep], dtype=np.float32)
+    ids = [index.ids[i] for i in keep]
+    rows = [index.rows[i] for i in keep]
+    metadata = [index.metadata[i] for i in keep]
+    exact_index = VectorIndex(ids, rows, metadata, matrix)
+    exact, exact_ms = run_queries(exact_index, queries, k)
+
+    report = []
+    for storage in STORAGE_MODES:
+        variant = exact_index if storage == "float32" else VectorIndex(
+            ids, rows, metadata, matrix, storage=storage)
+        for factor in ([0] if storage == "float32" else [0, rerank]):
+            approx, timings = (exact, exact_ms) if variant is exact_index else run_queries(
+                variant, queries, k, rerank=factor)
+            p50, p99 = latency_percentiles(timings)
+            report.append({
+                "storage": storage,
+                "rerank": factor,
+                "recall": recall_at_k(exact, approx, k),
+                "p50_ms": p50,
+                "p99_ms": p99,
+                "scan_mb": variant.scoring_nbytes / 2 ** 20,
+            })
+    return report
+
+
+def synthetic_matrix(num_rows, dim, num_clusters=None, spread=0.6, seed=0, chunk_rows=100000):
+    """Normalised rows scattered around random cluster centres, like real topic embeddings"""
+    rng = np.random.default_rng(seed)
+    num_clusters = num_clusters or max(16, int(np.sqrt(num_rows)))
+    centres = normalize_rows(rng.standard_normal((num_clusters, dim)).astype(np.float32))
+    matrix = np.empty((num_rows, dim), dtype=np.float32)
+    for start in range(0, num_rows, chunk_rows):
+        end = min(start + chunk_rows, num_rows)
+        labels = rng.integers(num_clusters, size=end - start)
+        noise = rng.standard_normal((end - start, dim)).astype(np.float32) * (spread / np.sqrt(dim))
+        matrix[start:end] = normalize_rows(centres[labels] + noise)
+    return matrix
+
+
+def ann_report(sizes, dim=256, k=10, nprobes=(1, 4, 16, 64), num_queries=200, seed=0):
+    """Exact vs IVF latency and recall@k for each synthetic table size"""
+    report = []
+    for num_rows in sizes:
+        # Independent draws from the same clusters; the last rows are never indexed
+        sample = synthetic_matrix(num_rows + num_queries, dim, seed=seed)
+        matrix, queries = sample[:num_rows], sample[num_rows:]
+        index = VectorIndex(range(num_rows), [None] * num_rows, [None] * num_rows, matrix)
+
+        exact, timings = run_queries(index, queries, k)
+        p50, p99 = latency_percentiles(timings)
+        report.append({"rows": num_rows, "mode": "exact", "nlist": 0, "nprobe": 0,
+                       "recall": 1.0, "p50_ms": p50, "p99_ms": p99, "build_s": 0.0})
+
+        start = time.perf_counter()
+        ivf = index.train_ivf()
+        build_s = time.perf_counter() - start
+        for nprobe in nprobes:
+            approx, timings = run_queries(index, queries, k, nprobe=nprobe)
+            p50, p99 = latency_percentiles(timings)
+            report.append({"rows": num_rows, "mode": "ivf", "nlist": ivf.nlist, "nprobe": nprobe,
+                           "recall": recall_at_k(exact, approx, k), "p50_ms": p50, "p99_ms": p99,
+                           "build_s": build_s})
+        del index, matrix, sample
+    return report
+
+
+def print_ann_report(report, k):
+    print(f"{'rows':>9} {'mode':<6} {'nlist':>6} {'nprobe':>6} {'recall@' + str(k):>10} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'build s':>8}")
+    for r in report:
+        print(f"{r['rows']:>9} {r['mode']:<6} {r['nlist']:>6} {r['nprobe']:>6} {r['recall']:>10.4f} "
+              f"{r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['build_s']:>8.1f}")
+
+
+def print_report(report, k):
+    print(f"{'storage':<8} {'rerank':>6} {'recall@' + str(k):>10} {'p50 ms':>8} {'p99 ms':>8} {'scan MB':>9}")
+    for r in report:
+        print(f"{r['storage']:<8} {r['rerank']:>6} {r['recall']:>10.4f} {r['p50_ms']:>8.3f} "
+              f"{r['p99_ms']:>8.3f} {r['scan_mb']:>9.1f}")
+
+
+def load_index(snapshot=None):
+    if snapshot:
+        return VectorIndex.load_snapshot(snapshot)
+    from Backend.rag import build_vector_index
+    return build_vector_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval index benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    recall = sub.add_parser("recall", help="recall@k of quantised storage vs exact search")
+    recall.add_argument("--k", type=int, default=10)
+    recall.add_argument("--queries", type=int, default=200)
+    recall.add_argument("--rerank", type=int, default=4)
+    recall.add_argument("--snapshot", help="snapshot directory instead of downloading vector_store")
+
+    ann = sub.add_parser("ann", help="IVF latency and recall vs exact search on synthetic rows")
+    ann.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    ann.add_argument("--dim", type=int, default=256)
+    ann.add_argument("--k", type=int, default=10)
+    ann.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    ann.add_argument("--queries", type=int, default=200)
+
+    args = parser.parse_args()
+    if args.command == "ann":
+        print_ann_report(ann_report(args.sizes, dim=args.dim, k=args.k, nprobes=args.nprobe,
+                                    num_queries=args.queries), args.k)
+    elif args.command == "recall":
+        index = load_index(args.snapshot)
+        if index is None or len(index) == 0:
+            raise SystemExit("No vector_store rows to benchmark")
+        print(f"DEBUG: {len(index)} rows, dim={index.dim}")
+        print_report(recall_report(index, k=args.k, num_queries=args.queries, rerank=args.rerank), args.k)
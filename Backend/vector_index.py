@@ -0,0 +1,852 @@
+import os
+import json
+import time
+import fcntl
+from contextlib import contextmanager
+import numpy as np
+from Backend.metadata_index import MetadataIndex
+from Backend.lexical_index import BM25Index, search_segments
+
+# Embedding columns kept out of the row payloads (embedding_vec is the pgvector copy)
+EMBEDDING_COLUMNS = ("embedding", "embedding_vec")
+# Scoring storage: exact float32, or float16 / int8 (per-row scale) codes
+STORAGE_MODES = ("float32", "float16", "int8")
+# Quantised codes are widened to float32 this many rows at a time while scoring
+SCORE_CHUNK_ROWS = 65536
+# Rows scored against the IVF centroids per block while assigning
+ASSIGN_CHUNK_ROWS = 16384
+# Rows per block in batched search, bounding the (queries x rows) score matrix
+BATCH_CHUNK_ROWS = 32768
+SNAPSHOT_POINTER = "CURRENT"
+SNAPSHOT_KEEP = 2
+# Spare rows allocated past the end of the embedding arrays so deltas append in place
+SPARE_ROWS_RATIO = 0.1
+MIN_SPARE_ROWS = 1024
+
+
+def parse_embedding(value):
+    """Embeddings are stored as JSON text in vector_store; accept lists too"""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def parse_metadata(value):
+    """Return row metadata as a dict, or None if it is missing or malformed"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except Exception:
+            return None
+    return value if isinstance(value, dict) else None
+
+
+def normalize_rows(matrix, out=None):
+    """L2-normalise each row; zero rows stay zero so their cosine score is 0"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    if out is not None:
+        return np.divide(matrix, norms, out=out)
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def normalize_vector(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return vector
+    return vector / norm
+
+
+def quantize_rows(matrix, storage):
+    """
+    Encode L2-normalised rows for `storage`. Returns (codes, scales); scales
+    is a per-row float32 multiplier for int8 and None otherwise.
+    """
+    if storage == "float16":
+        return matrix.astype(np.float16), None
+    if storage == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0 if matrix.size else np.empty(0)
+        scales = scales.astype(np.float32)
+        scales[scales == 0] = 1.0
+        codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Unknown vector storage {storage!r}; expected one of {STORAGE_MODES}")
+
+
+def max_watermark(current, candidate):
+    """Keep the latest updated-at / sequence value seen so far"""
+    if candidate is None:
+        return current
+    if current is None:
+        return candidate
+    return max(current, candidate)
+
+
+def top_k_positions(scores, top_k):
+    """Indices of the top_k highest scores, best first, via argpartition"""
+    if top_k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if scores.size > top_k:
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        part = np.arange(scores.size)
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def top_k_per_row(scores, top_k):
+    """Column indices of the top_k scores in each row (unordered)"""
+    if scores.shape[1] <= top_k:
+        return np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    return np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+
+
+class RowStore:
+    """
+    Backing array shared by successive index versions. Each version holds a
+    view of the first rows; appending writes into the spare capacity past
+    every existing view, so published versions never see the new rows and
+    the existing rows are not copied.
+    """
+
+    def __init__(self, data, used=0):
+        self.data = data
+        self.used = used
+
+    @classmethod
+    def allocate(cls, rows, shape, dtype):
+        spare = max(MIN_SPARE_ROWS, int(rows * SPARE_ROWS_RATIO))
+        return cls(np.empty((rows + spare,) + tuple(shape), dtype=dtype))
+
+
+def append_rows(store, view, block):
+    """
+    Append `block` after `view`, a view of the first rows of `store` (or
+    None). The rows are copied into a larger store only when the capacity is
+    exhausted, the store is read-only (a mapped snapshot) or a later version
+    already appended past `view`. Returns (store, new view).
+    """
+    length = view.shape[0]
+    end = length + block.shape[0]
+    if store is None or store.used != length or end > store.data.shape[0] or not store.data.flags.writeable:
+        grown = RowStore.allocate(end, block.shape[1:], block.dtype)
+        if length:
+            grown.data[:length] = view
+        store = grown
+    store.data[length:end] = block
+    store.used = end
+    return store, store.data[:end]
+
+
+def is_deleted_row(row, deleted_column):
+    """Soft-delete flag: a truthy boolean or a non-null deleted_at timestamp"""
+    if not deleted_column:
+        return False
+    return bool(row.get(deleted_column))
+
+
+def default_nlist(num_rows):
+    """Rule of thumb: about 4 * sqrt(n) coarse lists"""
+    return max(1, int(4 * np.sqrt(num_rows)))
+
+
+class IVFIndex:
+    """
+    Inverted-file coarse quantiser over a VectorIndex matrix.
+
+    Rows are bucketed by their nearest k-means centroid (cosine); a query
+    scans only the rows in its `nprobe` closest buckets. Assignments are kept
+    per row position so index deltas can re-bucket just the rows they touch.
+    """
+
+    def __init__(self, centroids, assignments):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        nlist = self.centroids.shape[0]
+        self.list_positions = np.argsort(self.assignments, kind="stable")
+        counts = np.bincount(self.assignments, minlength=nlist)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def train(cls, matrix, nlist=None, iterations=10, sample_size=None, seed=0):
+        """Spherical k-means on a sample of the (normalised) rows, then assign every row"""
+        num_rows = matrix.shape[0]
+        nlist = min(nlist or default_nlist(num_rows), num_rows)
+        rng = np.random.default_rng(seed)
+        sample_size = min(num_rows, sample_size or max(nlist * 64, 10000))
+        sample = np.asarray(matrix[np.sort(rng.choice(num_rows, size=sample_size, replace=False))],
+                            dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = assign_rows(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty lists from random sample rows
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()), replace=False)]
+            centroids = normalize_rows(sums)
+
+        return cls(centroids, assign_rows(matrix, centroids))
+
+    def assign(self, rows):
+        """Nearest centroid for each of `rows`"""
+        return assign_rows(rows, self.centroids)
+
+    def with_assignments(self, assignments):
+        return IVFIndex(self.centroids, assignments)
+
+    def probe(self, query, nprobe):
+        """Row positions in the `nprobe` lists closest to a normalised query"""
+        lists = top_k_positions(self.centroids @ query, min(nprobe, self.nlist))
+        chunks = [self.list_positions[self.offsets[l]:self.offsets[l + 1]] for l in lists]
+        return np.sort(np.concatenate(chunks)) if chunks else np.empty(0, dtype=np.int64)
+
+    def save(self, path):
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, centroids=self.centroids, assignments=self.assignments)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["centroids"], data["assignments"])
+
+
+def assign_rows(rows, centroids):
+    labels = np.empty(rows.shape[0], dtype=np.int32)
+    for start in range(0, rows.shape[0], ASSIGN_CHUNK_ROWS):
+        block = np.asarray(rows[start:start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        labels[start:start + ASSIGN_CHUNK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+class SideIndexSegment:
+    """
+    Metadata, BM25 and dealer-partition indexes over the rows at positions
+    [start, start + len(rows)) of an index version, each built on first use.
+    Segments are never modified, so later versions share them and a delta
+    only has to index the rows it appends.
+    """
+
+    def __init__(self, start, rows, metadata):
+        self.start = start
+        self.rows = rows
+        self.metadata = metadata
+        self._metadata_index = None
+        self._lexical_index = None
+        self._partitions = None
+
+    @property
+    def size(self):
+        return len(self.rows)
+
+    @property
+    def end(self):
+        return self.start + len(self.rows)
+
+    @property
+    def metadata_index(self):
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex(self.metadata, offset=self.start)
+        return self._metadata_index
+
+    def lexical_index(self, avg_length=None):
+        if self._lexical_index is None:
+            self._lexical_index = BM25Index(self.rows, self.metadata, offset=self.start, avg_length=avg_length)
+        return self._lexical_index
+
+    @property
+    def partitions(self):
+        """(shared positions, {dealer_id: private positions}) within the segment"""
+        if self._partitions is None:
+            shared = np.ones(self.size, dtype=bool)
+            dealers = {}
+            for pos, owner in self.metadata_index.private_owner.items():
+                shared[pos - self.start] = False
+                dealers.setdefault(owner, []).append(pos)
+            self._partitions = (
+                np.flatnonzero(shared) + self.start,
+                {owner: np.array(sorted(positions), dtype=np.int64) for owner, positions in dealers.items()},
+            )
+        return self._partitions
+
+
+def merge_segments(segments, rows, metadata):
+    """
+    Fold the newest segment into the one before it while it is at least as
+    large (binary-counter merging): a row is re-indexed O(log n) times over
+    its lifetime and a version has O(log n) segments.
+    """
+    segments = list(segments)
+    while len(segments) > 1 and segments[-2].size <= segments[-1].size:
+        newer = segments.pop()
+        older = segments.pop()
+        segments.append(SideIndexSegment(older.start, rows[older.start:newer.end], metadata[older.start:newer.end]))
+    return segments
+
+
+class VectorIndex:
+    """
+    Resident copy of the vector_store table.
+
+    Embeddings live in one contiguous, pre-normalised float32 matrix so a
+    cosine top-k is a single matrix-vector product. Row payloads (without the
+    embedding) and parsed metadata sit in side tables aligned with the matrix.
+
+    With float16 or int8 storage the scan runs over quantised codes and the
+    shortlist can be re-ranked against the exact float32 rows; when the index
+    is mapped from a snapshot those exact rows stay on disk until touched.
+
+    Rows are partitioned into a shared partition (product, inventory and
+    warehouse knowledge) and one private partition per dealer_id for sales
+    and claim rows; a dealer search only ever covers shared + its own.
+
+    An optional IVFIndex narrows a search to the rows in the `nprobe`
+    closest coarse lists instead of scanning every row.
+
+    An index is never mutated once published: apply_delta() returns a new
+    version, so readers holding the old one keep a consistent view. Deleted
+    and changed rows are tombstoned through the `alive` mask until the next
+    compaction; changed rows are re-appended rather than rewritten in place.
+    The metadata, BM25 and partition indexes are kept per segment of
+    positions and carried over between versions (see SideIndexSegment).
+    """
+
+    # Rebuild the matrix once this share of slots is tombstoned
+    COMPACT_DEAD_RATIO = 0.2
+
+    def __init__(self, ids, rows, metadata, matrix, version=0, alive=None, watermark=None,
+                 storage="float32", codes=None, scales=None, ivf=None, row_stores=None, id_to_pos=None,
+                 segments=None):
+        self.ids = list(ids)
+        self.rows = rows
+        self.metadata = metadata
+        self.matrix = matrix
+        self.storage = storage
+        if storage != "float32" and codes is None:
+            codes, scales = quantize_rows(matrix, storage)
+        self.codes = codes
+        self.scales = scales
+        self.ivf = ivf
+        self.version = version
+        self.watermark = watermark
+        self.alive = np.ones(len(self.ids), dtype=bool) if alive is None else alive
+        # name -> RowStore behind matrix / codes / scales, for in-place appends
+        self.row_stores = row_stores or {}
+        self.segments = segments or [SideIndexSegment(0, self.rows, self.metadata)]
+        self.snapshot = None
+        self._partitions = None
+        if id_to_pos is None:
+            id_to_pos = {row_id: pos for pos, row_id in enumerate(self.ids) if self.alive[pos]}
+        self.id_to_pos = id_to_pos
+
+    def __len__(self):
+        return len(self.id_to_pos)
+
+    @property
+    def dead_count(self):
+        return len(self.ids) - len(self.id_to_pos)
+
+    def match_metadata(self, metadata_filter, min_score=0.3):
+        """{position: score} of live rows matching a metadata filter (see MetadataIndex.match)"""
+        matches = {}
+        for segment in self.segments:
+            matches.update(segment.metadata_index.match(metadata_filter, min_score=min_score))
+        if self.dead_count:
+            matches = {pos: score for pos, score in matches.items() if self.alive[pos]}
+        return matches
+
+    def lexical_segments(self):
+        """BM25 index of every segment; later segments share the first one's length normalisation"""
+        first = self.segments[0].lexical_index()
+        return [first] + [segment.lexical_index(first.avg_length) for segment in self.segments[1:]]
+
+    def lexical_search(self, query, top_k=10, positions=None):
+        """BM25 top-k over the live rows as (score, position) pairs"""
+        return search_segments(self.lexical_segments(), query, top_k=top_k, positions=positions,
+                               alive=self.alive if self.dead_count else None)
+
+    def has_identifier_hit(self, query):
+        """True if an identifier-looking token in the query occurs in the row text"""
+        return any(segment.has_identifier_hit(query) for segment in self.lexical_segments())
+
+    @property
+    def partitions(self):
+        """(shared positions, {dealer_id: private positions}) for this version"""
+        if self._partitions is None:
+            parts = [segment.partitions for segment in self.segments]
+            dealers = {}
+            for _, segment_dealers in parts:
+                for owner, positions in segment_dealers.items():
+                    dealers.setdefault(owner, []).append(positions)
+            self._partitions = (
+                np.concatenate([shared for shared, _ in parts]) if parts else np.empty(0, dtype=np.int64),
+                {owner: np.concatenate(chunks) for owner, chunks in dealers.items()},
+            )
+        return self._partitions
+
+    def partition_positions(self, dealer_id=None):
+        """Positions a dealer may search (shared + own partition); None means every row"""
+        if dealer_id is None:
+            return None
+        shared, dealers = self.partitions
+        own = dealers.get(str(dealer_id))
+        if own is None:
+            return shared
+        return np.union1d(shared, own)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def train_ivf(self, nlist=None, **kwargs):
+        """Train and attach an IVF coarse index over this version's rows"""
+        if len(self.ids):
+            self.ivf = IVFIndex.train(self.matrix, nlist=nlist, **kwargs)
+        return self.ivf
+
+    @property
+    def scoring_nbytes(self):
+        """Bytes scanned per query: the codes (plus scales) or the float32 matrix"""
+        if self.storage == "float32":
+            return self.matrix.nbytes
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @classmethod
+    def from_rows(cls, rows, version=0, updated_column=None, deleted_column=None, storage="float32"):
+        """Build an index from raw vector_store rows; rows with a bad embedding are skipped"""
+        ids, payloads, metadata, vectors = [], [], [], []
+        dim = None
+        watermark = None
+        for row in rows:
+            watermark = max_watermark(watermark, row.get(updated_column) if updated_column else None)
+            if is_deleted_row(row, deleted_column):
+                continue
+            try:
+                vector = parse_embedding(row["embedding"])
+            except Exception:
+                continue
+            if vector.ndim != 1 or (dim is not None and vector.shape[0] != dim):
+                continue
+            dim = vector.shape[0]
+            ids.append(row.get("id"))
+            payloads.append({k: v for k, v in row.items() if k not in EMBEDDING_COLUMNS})
+            metadata.append(parse_metadata(row.get("metadata")))
+            vectors.append(vector)
+
+        row_stores = {}
+        if vectors:
+            # Built straight into a store with spare capacity for later deltas
+            store = RowStore.allocate(len(vectors), (dim,), np.float32)
+            matrix = store.data[:len(vectors)]
+            np.stack(vectors, out=matrix)
+            normalize_rows(matrix, out=matrix)
+            store.used = len(vectors)
+            row_stores["matrix"] = store
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        return cls(ids, payloads, metadata, matrix, version=version, watermark=watermark, storage=storage,
+                   row_stores=row_stores)
+
+    def apply_delta(self, rows, updated_column=None, deleted_column=None):
+        """
+        Return a new index version with the delta applied: deleted rows are
+        tombstoned, changed rows are tombstoned and appended again, new rows
+        are appended. Existing rows are never rewritten, so the embedding
+        arrays grow into their spare capacity instead of being copied. The
+        current index is left untouched so in-flight searches never observe
+        a half-applied update.
+        """
+        alive = self.alive
+        id_to_pos = dict(self.id_to_pos)
+        watermark = self.watermark
+        tombstoned, appends = [], {}
+        dim = self.dim or None
+
+        for row in rows:
+            row_id = row.get("id")
+            watermark = max_watermark(watermark, row.get(updated_column) if updated_column else None)
+            pos = id_to_pos.get(row_id)
+            if (pos is not None and updated_column
+                    and row.get(updated_column) == self.rows[pos].get(updated_column)):
+                # Already applied: the watermark query is inclusive
+                continue
+            deleted = is_deleted_row(row, deleted_column)
+            if not deleted:
+                try:
+                    vector = parse_embedding(row["embedding"])
+                except Exception:
+                    continue
+                if vector.ndim != 1 or (dim is not None and vector.shape[0] != dim):
+                    continue
+                dim = vector.shape[0]
+            if pos is not None:
+                tombstoned.append(pos)
+                del id_to_pos[row_id]
+            appends.pop(row_id, None)
+            if not deleted:
+                appends[row_id] = ({k: v for k, v in row.items() if k not in EMBEDDING_COLUMNS}, vector)
+
+        if not tombstoned and not appends:
+            return self
+        ids = list(self.ids)
+        payloads = list(self.rows)
+        metadata = list(self.metadata)
+        alive = alive.copy()
+        for pos in tombstoned:
+            alive[pos] = False
+            payloads[pos] = None
+            metadata[pos] = None
+
+        matrix, codes, scales = self.matrix, self.codes, self.scales
+        row_stores = dict(self.row_stores)
+        assignments = self.ivf.assignments if self.ivf is not None else None
+        segments = self.segments
+        if appends:
+            start = len(ids)
+            block = normalize_rows(np.vstack([vector for _, vector in appends.values()]))
+            row_stores["matrix"], matrix = append_rows(row_stores.get("matrix"), matrix, block)
+            if self.storage != "float32":
+                block_codes, block_scales = quantize_rows(block, self.storage)
+                row_stores["codes"], codes = append_rows(row_stores.get("codes"), codes, block_codes)
+                if block_scales is not None:
+                    row_stores["scales"], scales = append_rows(row_stores.get("scales"), scales, block_scales)
+            if assignments is not None:
+                assignments = np.concatenate([assignments, self.ivf.assign(block)])
+            for row_id, (payload, _) in appends.items():
+                id_to_pos[row_id] = len(ids)
+                ids.append(row_id)
+                payloads.append(payload)
+                metadata.append(parse_metadata(payload.get("metadata")))
+            alive = np.concatenate([alive, np.ones(len(appends), dtype=bool)])
+            # Tombstoned rows stay in their segment and are filtered by `alive`
+            segments = merge_segments(
+                segments + [SideIndexSegment(start, payloads[start:], metadata[start:])], payloads, metadata
+            )
+
+        index = VectorIndex(ids, payloads, metadata, matrix, version=self.version + 1,
+                            alive=alive, watermark=watermark,
+                            storage=self.storage, codes=codes, scales=scales,
+                            ivf=self.ivf.with_assignments(assignments) if assignments is not None else None,
+                            row_stores=row_stores, id_to_pos=id_to_pos, segments=segments)
+        if index.dead_count and index.dead_count > self.COMPACT_DEAD_RATIO * len(ids):
+            index = index.compact()
+        return index
+
+    def compact(self):
+        """Drop tombstoned slots and return a dense copy of the index"""
+        keep = np.flatnonzero(self.alive)
+        dense = self.matrix.size > 0
+        return VectorIndex(
+            [self.ids[i] for i in keep],
+            [self.rows[i] for i in keep],
+            [self.metadata[i] for i in keep],
+            np.ascontiguousarray(self.matrix[keep]) if dense else self.matrix,
+            version=self.version,
+            watermark=self.watermark,
+            storage=self.storage,
+            codes=self.codes[keep] if dense and self.codes is not None else None,
+            scales=self.scales[keep] if dense and self.scales is not None else None,
+            ivf=self.ivf.with_assignments(self.ivf.assignments[keep]) if self.ivf is not None else None,
+        )
+
+    def save_snapshot(self, directory):
+        """
+        Write the index as `<name>.npy` (embedding matrix) plus `<name>.json`
+        (ids, row payloads, watermark) and atomically point CURRENT at it.
+        Quantised storage adds `<name>.<storage>.npy` codes and, for int8,
+        `<name>.scales.npy`. Returns the snapshot name.
+        """
+        index = self.compact() if self.dead_count else self
+        os.makedirs(directory, exist_ok=True)
+        name = f"vector_index-{time.strftime('%Y%m%d%H%M%S')}-v{self.version}"
+        matrix_path = os.path.join(directory, name + ".npy")
+        sidecar_path = os.path.join(directory, name + ".json")
+
+        save_array(matrix_path, np.ascontiguousarray(index.matrix, dtype=np.float32))
+        if index.storage != "float32":
+            save_array(os.path.join(directory, f"{name}.{index.storage}.npy"), index.codes)
+            if index.scales is not None:
+                save_array(os.path.join(directory, name + ".scales.npy"), index.scales)
+        if index.ivf is not None:
+            index.ivf.save(os.path.join(directory, name + ".ivf.npz"))
+
+        sidecar = {
+            "version": index.version,
+            "storage": index.storage,
+            "watermark": index.watermark,
+            "shape": list(index.matrix.shape),
+            "ids": index.ids,
+            "rows": index.rows,
+        }
+        with open(sidecar_path + ".tmp", "w") as f:
+            json.dump(sidecar, f, default=str)
+        os.replace(sidecar_path + ".tmp", sidecar_path)
+
+        pointer_path = os.path.join(directory, SNAPSHOT_POINTER)
+        with open(pointer_path + ".tmp", "w") as f:
+            f.write(name)
+        os.replace(pointer_path + ".tmp", pointer_path)
+
+        prune_snapshots(directory, keep=SNAPSHOT_KEEP)
+        return name
+
+    @classmethod
+    def load_snapshot(cls, directory, name=None, storage=None):
+        """
+        Open the current (or named) snapshot with the matrix memory-mapped
+        read-only, so every process mapping it shares one page-cache copy.
+        Quantised codes are mapped too; asking for a different `storage` than
+        the snapshot was written with re-quantises in process memory.
+        Returns None when no snapshot exists.
+        """
+        name = name or current_snapshot_name(directory)
+        if not name:
+            return None
+        matrix_path = os.path.join(directory, name + ".npy")
+        sidecar_path = os.path.join(directory, name + ".json")
+        if not (os.path.exists(matrix_path) and os.path.exists(sidecar_path)):
+            return None
+
+        with open(sidecar_path) as f:
+            sidecar = json.load(f)
+        matrix = np.load(matrix_path, mmap_mode="r")
+        saved_storage = sidecar.get("storage", "float32")
+        storage = storage or saved_storage
+        codes = scales = None
+        if storage != "float32" and storage == saved_storage:
+            codes = np.load(os.path.join(directory, f"{name}.{storage}.npy"), mmap_mode="r")
+            scales_path = os.path.join(directory, name + ".scales.npy")
+            if os.path.exists(scales_path):
+                scales = np.load(scales_path, mmap_mode="r")
+        rows = sidecar["rows"]
+        index = cls(
+            sidecar["ids"],
+            rows,
+            [parse_metadata(row.get("metadata")) for row in rows],
+            matrix,
+            version=sidecar["version"],
+            watermark=sidecar.get("watermark"),
+            storage=storage,
+            codes=codes,
+            scales=scales,
+        )
+        ivf_path = os.path.join(directory, name + ".ivf.npz")
+        if os.path.exists(ivf_path):
+            index.ivf = IVFIndex.load(ivf_path)
+        index.snapshot = name
+        return index
+
+    def score(self, query, positions=None):
+        """
+        Cosine scores of a normalised query against every row, or `positions`
+        only. Quantised storage gives approximate scores.
+        """
+        if self.storage == "float32":
+            matrix = self.matrix if positions is None else self.matrix[positions]
+            return np.asarray(matrix @ query, dtype=np.float32)
+
+        codes = self.codes if positions is None else self.codes[positions]
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_CHUNK_ROWS):
+            block = codes[start:start + SCORE_CHUNK_ROWS].astype(np.float32)
+            scores[start:start + SCORE_CHUNK_ROWS] = block @ query
+        if self.scales is not None:
+            scores *= self.scales if positions is None else self.scales[positions]
+        return scores
+
+    def search(self, query_embedding, top_k=10, positions=None, similarity_threshold=None, rerank=0,
+               nprobe=None):
+        """
+        Cosine top-k over the whole index, or over `positions` only.
+        With quantised storage and rerank > 0, the best top_k * rerank rows by
+        approximate score are re-scored against the exact float32 rows.
+        With an IVF index and nprobe > 0, only rows in the nprobe closest
+        lists are scanned (approximate); small `positions` sets stay exact.
+        Returns a list of (similarity, position) pairs, best first.
+        """
+        if len(self) == 0 or top_k <= 0:
+            return []
+        query = normalize_vector(query_embedding)
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Query dimension {query.shape[0]} does not match index dimension {self.dim}")
+
+        if self.ivf is not None and nprobe:
+            probed = self.ivf.probe(query, nprobe)
+            if positions is None:
+                positions = probed
+            elif len(positions) > probed.size:
+                positions = np.intersect1d(np.asarray(positions, dtype=np.int64), probed, assume_unique=True)
+
+        if positions is None:
+            scores = self.score(query)
+            if self.dead_count:
+                scores[~self.alive] = -np.inf
+            candidate_positions = np.arange(scores.shape[0])
+        else:
+            candidate_positions = np.asarray(positions, dtype=np.int64)
+            if self.dead_count:
+                candidate_positions = candidate_positions[self.alive[candidate_positions]]
+            if candidate_positions.size == 0:
+                return []
+            if candidate_positions.size > len(self.ids) // 2:
+                # Scoring every row beats gathering most of the matrix
+                scores = self.score(query)[candidate_positions]
+            else:
+                scores = self.score(query, candidate_positions)
+
+        if self.storage != "float32" and rerank > 0:
+            shortlist = np.sort(candidate_positions[top_k_positions(scores, top_k * rerank)])
+            if self.dead_count:
+                shortlist = shortlist[self.alive[shortlist]]
+            scores = np.asarray(self.matrix[shortlist] @ query, dtype=np.float32)
+            candidate_positions = shortlist
+
+        best = top_k_positions(scores, top_k)
+        results = []
+        for i in best:
+            score = float(scores[i])
+            if score == -np.inf or (similarity_threshold is not None and score < similarity_threshold):
+                break
+            results.append((score, int(candidate_positions[i])))
+        return results
+
+    def dense_rows(self, positions=None, start=None, end=None):
+        """Scoring rows as float32 (dequantised for float16 / int8 storage)"""
+        source = self.matrix if self.storage == "float32" else self.codes
+        block = source[start:end] if positions is None else source[positions]
+        block = np.asarray(block, dtype=np.float32)
+        if self.scales is not None:
+            scales = self.scales[start:end] if positions is None else self.scales[positions]
+            block = block * np.asarray(scales)[:, None]
+        return block
+
+    def search_batch(self, query_embeddings, top_k=10, positions=None, similarity_threshold=None, rerank=0):
+        """
+        Top-k for many queries at once: each block of rows is scored against
+        all queries with one matrix-matrix product and merged into a running
+        per-query top-k. Returns one list of (similarity, position) per query.
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if len(self) == 0 or top_k <= 0 or queries.shape[0] == 0:
+            return [[] for _ in range(queries.shape[0])]
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match index dimension {self.dim}")
+        queries = normalize_rows(queries)
+
+        if positions is None:
+            candidate_positions = None
+            total = len(self.ids)
+        else:
+            candidate_positions = np.asarray(positions, dtype=np.int64)
+            if self.dead_count:
+                candidate_positions = candidate_positions[self.alive[candidate_positions]]
+            total = candidate_positions.size
+
+        quantized = self.storage != "float32" and rerank > 0
+        keep = top_k * rerank if quantized else top_k
+        best_scores = np.empty((queries.shape[0], 0), dtype=np.float32)
+        best_positions = np.empty((queries.shape[0], 0), dtype=np.int64)
+        for start in range(0, total, BATCH_CHUNK_ROWS):
+            end = min(start + BATCH_CHUNK_ROWS, total)
+            if candidate_positions is None:
+                block_positions = np.arange(start, end)
+                block = self.dense_rows(start=start, end=end)
+            else:
+                block_positions = candidate_positions[start:end]
+                block = self.dense_rows(block_positions)
+            scores = queries @ block.T
+            if candidate_positions is None and self.dead_count:
+                scores[:, ~self.alive[start:end]] = -np.inf
+
+            scores = np.hstack([best_scores, scores])
+            merged = np.hstack([best_positions, np.broadcast_to(block_positions, (queries.shape[0], block_positions.size))])
+            top = top_k_per_row(scores, keep)
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_positions = np.take_along_axis(merged, top, axis=1)
+
+        results = []
+        for query, scores, found in zip(queries, best_scores, best_positions):
+            if quantized:
+                found = found[np.isfinite(scores)]
+                scores = np.asarray(self.matrix[found] @ query, dtype=np.float32)
+            hits = []
+            for i in top_k_positions(scores, top_k):
+                score = float(scores[i])
+                if score == -np.inf or (similarity_threshold is not None and score < similarity_threshold):
+                    break
+                hits.append((score, int(found[i])))
+            results.append(hits)
+        return results
+
+
+def save_array(path, array):
+    """np.save through a temp file so readers never map a partial file"""
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+
+def current_snapshot_name(directory):
+    """Name of the snapshot CURRENT points at, or None"""
+    try:
+        with open(os.path.join(directory, SNAPSHOT_POINTER)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_age(directory):
+    """Seconds since CURRENT was last moved, or infinity when there is no snapshot"""
+    try:
+        return max(0.0, time.time() - os.path.getmtime(os.path.join(directory, SNAPSHOT_POINTER)))
+    except FileNotFoundError:
+        return float("inf")
+
+
+def prune_snapshots(directory, keep=SNAPSHOT_KEEP):
+    """
+    Delete all but the newest `keep` snapshots. Processes that still map an
+    older file keep a valid mapping until they remap, since unlink only drops
+    the directory entry.
+    """
+    entries = [
+        entry for entry in os.listdir(directory)
+        if entry.startswith("vector_index-") and entry.endswith((".npy", ".npz", ".json"))
+    ]
+    names = sorted({entry.split(".", 1)[0] for entry in entries})
+    current = current_snapshot_name(directory)
+    stale = set(names[:-keep] if keep else names) - {current}
+    for entry in entries:
+        if entry.split(".", 1)[0] in stale:
+            try:
+                os.remove(os.path.join(directory, entry))
+            except FileNotFoundError:
+                pass
+
+
+@contextmanager
+def snapshot_lock(directory, blocking=True):
+    """
+    Cross-process lock so only one worker builds or publishes a snapshot at
+    a time. Yields False when non-blocking and another process holds it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as f:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(f, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,95 @@
+import time
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from Backend import app as app_module
+from Backend import rag
+
+
+@pytest.fixture
+def sql_calls(monkeypatch):
+    """Every query runs the same slow SELECT through try_select_sql; returns the executions"""
+    calls = []
+    lock = threading.Lock()
+    session = rag.UserSession(user_id=1, username="deepak.mehta", role="admin")
+
+    def run_select_sql(sql, deadline=None):
+        with lock:
+            calls.append(sql)
+        time.sleep(0.3)
+        return [{"total_stock": 40}], None
+
+    def process_user_query(user_query, user_session, deadline=None):
+        rag.set_current_user(user_session)
+        result, _ = rag.try_select_sql("SELECT sum(quantity) AS total_stock FROM inventory", deadline)
+        return str(result)
+
+    monkeypatch.setattr(rag, "run_select_sql", run_select_sql)
+    monkeypatch.setattr(app_module, "get_default_user_session", lambda: session)
+    monkeypatch.setattr(app_module, "process_user_query", process_user_query)
+    return calls
+
+
+def send_concurrently(path, count=2, **kwargs):
+    """`count` identical requests in flight at once on one event loop, as in a single worker"""
+    async def run():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[client.post(path, **kwargs) for _ in range(count)])
+    return asyncio.run(run())
+
+
+def test_concurrent_identical_queries_share_one_sql_execution(sql_calls):
+    responses = send_concurrently("/api/query", json={"query": "total stock"})
+    assert [r.json()["answer"] for r in responses] == ["[{'total_stock': 40}]"] * 2
+    assert len(sql_calls) == 1
+
+
+def test_concurrent_whatsapp_messages_share_one_sql_execution(sql_calls):
+    responses = send_concurrently("/whatsapp", data={"Body": "total stock", "From": "whatsapp:+91"})
+    assert all("total_stock" in r.text for r in responses)
+    assert len(sql_calls) == 1
+
+
+@pytest.fixture
+def stream_pipeline(monkeypatch):
+    """Stub the context stages of stream_answer; returns a setter for the final-answer stream"""
+    session = rag.UserSession(user_id=1, username="deepak.mehta", role="admin")
+    monkeypatch.setattr(app_module, "get_default_user_session", lambda: session)
+    monkeypatch.setattr(rag, "handle_order_intent", lambda user_query, deadline=None: None)
+    monkeypatch.setattr(rag, "lookup_cached_answer", lambda user_query, user_session, deadline=None: (None, None))
+    monkeypatch.setattr(rag, "gather_contexts", lambda *args: ("sql", "rag", "", {}, []))
+    monkeypatch.setattr(rag, "save_to_supabase", lambda *args: None)
+
+    def use(final_stream):
+        monkeypatch.setattr(rag, "stream_llm_final_response", lambda *args: final_stream())
+    return use
+
+
+def sse_events(response):
+    return [block.split("\n")[0][len("event: "):] for block in response.text.strip().split("\n\n")]
+
+
+def test_stream_cut_off_midway_ends_with_error(stream_pipeline):
+    def final_stream():
+        yield "Roadking is "
+        raise ConnectionError("stream reset")
+
+    stream_pipeline(final_stream)
+    response, = send_concurrently("/api/query/stream", count=1, json={"query": "stock of roadking"})
+    assert sse_events(response) == ["delta", "error"]
+    assert rag.FALLBACK_ANSWER not in response.text
+
+
+def test_stream_failing_before_first_delta_falls_back(stream_pipeline):
+    def final_stream():
+        raise ConnectionError("refused")
+        yield
+
+    stream_pipeline(final_stream)
+    response, = send_concurrently("/api/query/stream", count=1, json={"query": "stock of roadking"})
+    assert sse_events(response) == ["delta", "done"]
+    assert rag.FALLBACK_ANSWER in response.text
@@ -0,0 +1,157 @@
+import numpy as np
+
+from Backend.cache import EmbeddingCache, ResponseCache, SemanticAnswerCache
+from Backend.lexical_index import key_terms
+
+
+def embedding(seed, dim=16):
+    return np.random.default_rng(seed).normal(size=dim)
+
+
+def test_key_terms_keeps_identifiers_and_numbers():
+    assert key_terms("Stock of RK-205/55R16 at dealer 7?") == ("7", "rk-205/55r16")
+    assert key_terms("how many roadking tyres are left") == ()
+
+
+def test_near_duplicate_with_different_sku_misses():
+    cache = SemanticAnswerCache(threshold=0.95)
+    vector = embedding(0)
+    first = "What is the price of SKU RK-1001?"
+    second = "What is the price of SKU RK-1002?"
+    cache.put(("dealer", "7"), vector, "1200", first, key_terms(first))
+
+    # Same embedding, so only the identifier tokens tell the questions apart
+    assert cache.get(("dealer", "7"), vector, key_terms(second)) is None
+    assert cache.get(("dealer", "7"), vector * 1.01, key_terms(first))[0] == "1200"
+
+
+def test_different_number_misses():
+    cache = SemanticAnswerCache(threshold=0.95)
+    vector = embedding(1)
+    cache.put(("admin", None), vector, "shipped", "status of order 55", key_terms("status of order 55"))
+    assert cache.get(("admin", None), vector, key_terms("status of order 56")) is None
+
+
+def test_scope_isolation():
+    cache = SemanticAnswerCache(threshold=0.95)
+    vector = embedding(2)
+    cache.put(("dealer", "7"), vector, "dealer 7 sales", "total sales")
+    assert cache.get(("dealer", "8"), vector) is None
+    assert cache.get(("dealer", "7"), vector)[0] == "dealer 7 sales"
+
+
+def test_threshold_and_ttl():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.put("scope", embedding(3), "answer", "question")
+    assert cache.get("scope", embedding(4)) is None
+
+    expired = SemanticAnswerCache(threshold=0.95, ttl=-1)
+    expired.put("scope", embedding(3), "answer", "question")
+    assert expired.get("scope", embedding(3)) is None
+    assert expired.size == 0
+
+
+def test_eviction_and_invalidate():
+    cache = SemanticAnswerCache(threshold=0.95, maxsize=2)
+    for i in range(3):
+        cache.put("scope", embedding(10 + i), f"answer {i}", terms=(str(i),))
+    assert cache.size == 2
+    assert cache.get("scope", embedding(10), ("0",)) is None
+    assert cache.get("scope", embedding(12), ("2",))[0] == "answer 2"
+
+    cache.invalidate()
+    assert cache.size == 0
+    assert cache.get("scope", embedding(12), ("2",)) is None
+
+
+def test_invalidation_reaches_other_workers(tmp_path):
+    generation_file = str(tmp_path / "answer_cache.generation")
+    workers = [SemanticAnswerCache(threshold=0.95, generation_file=generation_file) for _ in range(2)]
+    for worker in workers:
+        worker.put("scope", embedding(20), "40 units in stock")
+
+    workers[0].invalidate()
+    assert workers[1].get("scope", embedding(20)) is None
+    assert workers[1].invalidations == 1
+
+    # Local invalidations and unchanged generations leave the other worker alone
+    workers[1].put("scope", embedding(20), "38 units in stock")
+    workers[0].invalidate(shared=False)
+    assert workers[1].get("scope", embedding(20))[0] == "38 units in stock"
+
+
+def sql_payload(role="dealer 7", history=()):
+    messages = [{"role": "system", "content": f"Write SQL for a {role}."}]
+    for question, answer in history:
+        messages += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+    messages.append({"role": "user", "content": "total sales last month"})
+    return {"messages": messages, "temperature": 0}
+
+
+def test_response_cache_ttl():
+    cache = ResponseCache("1", ttl=60)
+    cache.put("sql", "chat", sql_payload(), "SELECT 1")
+    assert cache.get("sql", "chat", sql_payload()) == "SELECT 1"
+
+    expired = ResponseCache("1", ttl=-1)
+    expired.put("sql", "chat", sql_payload(), "SELECT 1")
+    assert expired.get("sql", "chat", sql_payload()) is None
+    assert expired.stats()["stages"]["sql"] == {"hits": 0, "misses": 1, "expired": 1, "hit_rate": 0.0}
+    assert expired.stats()["size"] == 0
+
+
+def test_response_cache_schema_version_bump_misses():
+    cache = ResponseCache("1")
+    cache.put("sql", "chat", sql_payload(), "SELECT 1")
+    # Same entries, read by a process whose prompts moved on
+    bumped = ResponseCache("2")
+    bumped.memory = cache.memory
+    assert bumped.get("sql", "chat", sql_payload()) is None
+    assert cache.get("sql", "chat", sql_payload()) == "SELECT 1"
+
+
+def test_response_cache_keys_follow_role_and_history():
+    cache = ResponseCache("1")
+    history = [("stock of roadking", "40 units")]
+    cache.put("sql", "chat", sql_payload(history=history), "SELECT 1")
+    assert cache.get("sql", "chat", sql_payload(history=history)) == "SELECT 1"
+    assert cache.get("sql", "chat", sql_payload(role="dealer 8", history=history)) is None
+    assert cache.get("sql", "chat", sql_payload(role="admin", history=history)) is None
+    assert cache.get("sql", "chat", sql_payload()) is None
+    assert cache.get("sql", "chat", sql_payload(history=[("stock of roadking", "38 units")])) is None
+    # Stages never share entries
+    assert cache.get("metadata", "chat", sql_payload(history=history)) is None
+
+
+def test_embedding_cache_evicts_least_recently_used():
+    cache = EmbeddingCache("model:1", maxsize=2)
+    cache.put("roadking", [1.0, 0.0])
+    cache.put("speedocruze", [0.0, 1.0])
+    assert cache.get("roadking") is not None
+    cache.put("pune", [0.5, 0.5])
+
+    # "speedocruze" was the least recently used
+    assert cache.get("speedocruze") is None
+    assert cache.get("roadking").tolist() == [1.0, 0.0]
+    assert cache.get("pune").dtype == np.float32
+    assert cache.stats()["memory"]["evictions"] == 1
+
+
+def test_embedding_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    EmbeddingCache("model:1", maxsize=1, path=path).put("roadking", [1.0, 0.0])
+
+    restarted = EmbeddingCache("model:1", maxsize=1, path=path)
+    assert restarted.get("roadking").tolist() == [1.0, 0.0]
+    assert restarted.stats()["disk"] == {"hits": 1, "misses": 0, "enabled": True}
+    # Promoted into memory: the second read does not touch the disk
+    assert restarted.get("roadking") is not None
+    assert restarted.stats()["disk"]["hits"] == 1
+
+    # Evicted from memory, still served from disk
+    restarted.put("pune", [0.5, 0.5])
+    assert restarted.get("roadking").tolist() == [1.0, 0.0]
+    assert restarted.stats()["disk"]["hits"] == 2
+
+    # Another model version never sees these vectors
+    assert EmbeddingCache("model:2", path=path).get("roadking") is None
@@ -0,0 +1,61 @@
+from Backend.context_budget import (
+    allocate, assemble_context, estimate_tokens, numeric_totals, rag_section, sql_section, truncate_text,
+)
+
+
+def order_rows(count):
+    return [{"order_id": 1000 + i, "dealer_id": 7, "unit_price": 2500.0, "quantity": 2, "total_cost": 5000.0,
+             "status": "shipped"} for i in range(count)]
+
+
+def test_truncate_text_respects_budget():
+    text = " ".join(f"word{i}" for i in range(500))
+    truncated = truncate_text(text, 50)
+    assert truncated.endswith(" …")
+    assert estimate_tokens(truncated[:-2]) <= 50
+    assert truncate_text("short text", 50) == "short text"
+
+
+def test_numeric_totals_only_sums_additive_columns():
+    totals = numeric_totals(order_rows(3))
+    assert totals == {"quantity": 6, "total_cost": 15000.0}
+
+
+def test_sql_section_reports_omitted_rows_and_totals():
+    rows = order_rows(200)
+    section = sql_section(rows, 300)
+    assert estimate_tokens(section) <= 300
+    assert f"of {len(rows)} rows" in section
+    assert "quantity=400" in section
+    assert "unit_price" not in section.split("(showing")[1]
+    assert "order_id=" not in section
+
+
+def test_sql_section_keeps_everything_within_budget():
+    rows = order_rows(2)
+    section = sql_section(rows, 1000)
+    assert "showing" not in section
+    assert section.count("order_id") == 2
+
+
+def test_rag_section_drops_lowest_ranked_rows():
+    rows = [{"product_name": f"Tyre {i}", "description": "radial " * 30, "embedding": [0.1] * 8} for i in range(20)]
+    section = rag_section(rows, 200)
+    assert "Tyre 0" in section
+    assert "Tyre 19" not in section
+    assert "lower-ranked rows omitted" in section
+    assert "embedding" not in section
+
+
+def test_allocate_redistributes_unused_share():
+    grants = allocate({"sql": 10, "rag": 5000, "history": 0}, 1000)
+    assert grants["sql"] == 10
+    assert grants["history"] == 0
+    assert grants["rag"] == 990
+
+
+def test_assemble_context_fits_budget():
+    history = [{"user_query": "stock of RK-1001", "ai_response": "in stock " * 100}] * 3
+    sql, rag, hist = assemble_context(order_rows(100), [{"product_name": "Tyre"}], history, 800)
+    assert estimate_tokens(sql) + estimate_tokens(rag) + estimate_tokens(hist) <= 800 + 20
+    assert "Tyre" in rag
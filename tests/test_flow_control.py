@@ -0,0 +1,134 @@
+import time
+
+import pytest
+
+from Backend.flow_control import AIMDLimiter, CircuitBreaker, Deadline, DeadlineExceeded, Upstream, UpstreamUnavailable
+
+
+def test_aimd_admits_up_to_the_limit():
+    limiter = AIMDLimiter(initial=2)
+    assert limiter.acquire(0) is not None
+    assert limiter.acquire(0) is not None
+    assert limiter.acquire(0.05) is None
+    limiter.release()
+    assert limiter.acquire(0) is not None
+
+
+def test_aimd_additive_increase():
+    limiter = AIMDLimiter(initial=4, maximum=5)
+    for _ in range(4):
+        limiter.acquire(0)
+        limiter.release(success=True)
+    assert limiter.limit == pytest.approx(5.0, abs=0.1)
+    for _ in range(20):
+        limiter.acquire(0)
+        limiter.release(success=True)
+    assert limiter.limit == 5
+
+
+def test_aimd_multiplicative_decrease_once_per_interval():
+    limiter = AIMDLimiter(initial=16, minimum=2, decrease_interval=60)
+    for _ in range(3):
+        limiter.acquire(0)
+        limiter.release(overloaded=True)
+    assert limiter.limit == 8
+
+    limiter = AIMDLimiter(initial=16, minimum=2, decrease_interval=0)
+    for _ in range(5):
+        limiter.acquire(0)
+        limiter.release(overloaded=True)
+    assert limiter.limit == 2
+
+
+def test_aimd_failure_without_overload_keeps_limit():
+    limiter = AIMDLimiter(initial=8)
+    limiter.acquire(0)
+    limiter.release(success=False)
+    assert limiter.limit == 8
+    assert limiter.inflight == 0
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    for _ in range(2):
+        breaker.record(False)
+    assert breaker.state == "closed"
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failures():
+    breaker = CircuitBreaker(threshold=3)
+    breaker.record(False)
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_allows_one_probe():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.record(False)
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed probe re-opens the breaker for another cooldown
+    breaker.record(False)
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_upstream_rejects_when_open_or_saturated():
+    upstream = Upstream("chat", limiter=AIMDLimiter(initial=1), breaker=CircuitBreaker(threshold=1, cooldown=60))
+    upstream.acquire(0)
+    with pytest.raises(UpstreamUnavailable):
+        upstream.acquire(0.01)
+    upstream.release(success=False)
+    with pytest.raises(UpstreamUnavailable):
+        upstream.acquire(0)
+    stats = upstream.stats()
+    assert stats["calls"] == 1
+    assert stats["rejected_queue"] == 1
+    assert stats["rejected_open"] == 1
+    assert stats["breaker"] == "open"
+
+
+def test_upstream_queue_rejection_returns_probe():
+    upstream = Upstream("embedding", limiter=AIMDLimiter(initial=1),
+                        breaker=CircuitBreaker(threshold=1, cooldown=0.05))
+    upstream.acquire(0)
+    upstream.breaker.record(False)
+    time.sleep(0.06)
+    with pytest.raises(UpstreamUnavailable):
+        upstream.acquire(0.01)
+    # The probe slot taken before the queue timeout is available again
+    assert upstream.breaker.allow()
+
+
+def test_deadline_reserve_and_cap():
+    deadline = Deadline(10)
+    assert 9 < deadline.remaining() <= 10
+    assert not deadline.expired()
+    assert deadline.cap(3) == 3
+    assert deadline.cap(60) <= 10
+
+    reserved = deadline.reserve(4)
+    assert 5 < reserved.remaining() <= 6
+    assert deadline.reserve(20).expired()
+
+
+def test_expired_deadline_refuses_calls():
+    deadline = Deadline(0)
+    assert deadline.expired()
+    assert deadline.remaining() == 0
+    with pytest.raises(DeadlineExceeded):
+        deadline.cap(5)
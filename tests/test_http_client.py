@@ -0,0 +1,107 @@
+import io
+import threading
+import time
+
+import pytest
+import requests
+
+from Backend import http_client
+from Backend.flow_control import Deadline
+from Backend.pipeline import StageTimings
+
+
+def response(status_code, headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result.raw = io.BytesIO(b"")
+    return result
+
+
+class FakeSession:
+    """Answers POSTs from `script`: a status code, or (seconds to wait, status code); records every call"""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def post(self, url, headers=None, json=None, timeout=None, stream=False):
+        with self.lock:
+            self.calls.append({"timeout": timeout, "at": time.perf_counter()})
+            step = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        delay, status = step if isinstance(step, tuple) else (0, step)
+        # Not time.sleep, which the fixture records instead of sleeping
+        threading.Event().wait(delay)
+        return response(status, {"Retry-After": "1.5"} if status == 429 else None)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Fresh upstreams and latency window; sleeps between retries are recorded, not slept"""
+    monkeypatch.setattr(http_client, "upstreams",
+                        {name: http_client.build_upstream(name) for name in ("chat", "embedding")})
+    monkeypatch.setattr(http_client, "call_timings", StageTimings())
+    monkeypatch.setattr(http_client, "hedge_counts", {"hedged": 0, "hedge_won": 0})
+    sleeps = []
+    monkeypatch.setattr(http_client.time, "sleep", sleeps.append)
+
+    def install(*script):
+        fake = FakeSession(*script)
+        monkeypatch.setattr(http_client, "session", fake)
+        return fake
+
+    return install, sleeps
+
+
+def post(stage, **kwargs):
+    return http_client.post_json("https://upstream.test", {}, {"input": "x"}, stage=stage, **kwargs)
+
+
+def test_retry_after_is_honoured(client):
+    install, sleeps = client
+    fake = install(429, 200)
+    assert post("sql").status_code == 200
+    assert len(fake.calls) == 2
+    assert sleeps == [1.5]
+
+
+def test_degradable_stages_are_not_retried(client):
+    install, sleeps = client
+    for stage in http_client.DEGRADABLE_STAGES:
+        fake = install(503, 200)
+        assert post(stage).status_code == 503
+        assert len(fake.calls) == 1
+    assert sleeps == []
+
+
+def test_deadline_caps_attempt_timeout(client):
+    install, _ = client
+    fake = install(200)
+    post("final", deadline=Deadline(2))
+    connect, read = fake.calls[0]["timeout"]
+    assert connect <= 2 and read <= 2
+    post("final")
+    assert fake.calls[1]["timeout"] == http_client.STAGE_TIMEOUTS["final"]
+
+
+def test_hedge_fires_only_after_p95(client):
+    install, _ = client
+    # Too few samples: never hedged
+    fake = install((0.3, 200))
+    assert post("embedding").status_code == 200
+    assert len(fake.calls) == 1
+
+    for _ in range(http_client.HEDGE_MIN_SAMPLES):
+        http_client.call_timings.record("embedding", 0.1)
+    # Answers within the p95: no duplicate
+    fake = install((0.02, 200))
+    post("embedding")
+    assert len(fake.calls) == 1
+
+    # A slow primary gets a duplicate no earlier than the p95, and the duplicate wins
+    fake = install((0.6, 200), (0.0, 200))
+    assert post("embedding").status_code == 200
+    primary, hedge = fake.calls
+    assert hedge["at"] - primary["at"] >= 0.1
+    assert http_client.hedge_counts == {"hedged": 1, "hedge_won": 1}
@@ -0,0 +1,52 @@
+import pytest
+
+from Backend.intent_router import IntentRouter, NaiveBayesIntentModel, label_from_response
+
+
+def classify(text, **signals):
+    return IntentRouter().classify(text, **signals)[0]
+
+
+@pytest.mark.parametrize("text, signals", [
+    ("order 50 units of 100/35R24 for dealer 7", {"has_product": True, "has_dealer": True}),
+    ("order 5 roadking", {"keyword_intent": "order", "has_product": True}),
+    ("buy 12 tyres of speedocruze pro for dealer 123", {"has_product": True, "has_dealer": True}),
+])
+def test_orders_route_to_order(text, signals):
+    assert classify(text, **signals) == "order"
+
+
+@pytest.mark.parametrize("text", [
+    "cancel order 55",
+    "order status of order 55",
+    "track order 55",
+    "what is the stock of roadking?",
+    "show pending claims for dealer 7",
+    "how many units did we sell last month",
+])
+def test_lookups_and_questions_route_to_info(text):
+    assert classify(text, keyword_intent="order") == "info"
+
+
+def test_trained_model_shifts_probability():
+    examples = [(f"order {n} units of roadking", "order") for n in range(1, 11)]
+    examples += [(f"stock of roadking in warehouse {n}", "info") for n in range(1, 11)]
+    model = NaiveBayesIntentModel().fit(examples)
+    assert model.is_trained()
+    assert model.log_odds("order 3 units of roadking") > 0
+    assert model.log_odds("stock of roadking") < 0
+
+    router = IntentRouter(model)
+    assert router.probability("order 3 units of roadking") > IntentRouter().probability("order 3 units of roadking")
+
+
+def test_untrained_model_is_ignored():
+    model = NaiveBayesIntentModel().fit([("order 5 units", "order")])
+    assert IntentRouter(model).model is None
+
+
+def test_label_from_response():
+    assert label_from_response("✅ Order placed successfully:\n- Order ID: 9") == "order"
+    assert label_from_response("❌ Missing order details. Please specify dealer, product, and quantity.") == "order"
+    assert label_from_response("Roadking is in stock at Pune.") == "info"
+    assert label_from_response(None) == "info"
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from Backend.lexical_index import (
+    BM25Index, is_identifier_token, reciprocal_rank_fusion, row_text, search_segments, tokenize,
+)
+
+ROWS = [
+    {"id": 1, "content": "RoadKing 100/35R24 50P radial tyre", "embedding": "[0.1]"},
+    {"id": 2, "content": "SpeedoCruze Pro 205-55-r16 touring tyre"},
+    {"id": 3, "content": "Warehouse Pune stock report for radial tyres"},
+    {"id": 4, "content": "Claim for damaged SpeedoCruze Pro"},
+]
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    assert tokenize("RoadKing 100/35R24") == ["roadking", "100/35r24", "100", "35r24"]
+    assert is_identifier_token("100/35r24")
+    assert is_identifier_token("rk-100")
+    assert not is_identifier_token("roadking")
+    assert not is_identifier_token("100")
+
+
+def test_row_text_skips_bookkeeping_columns():
+    text = row_text({"id": 9, "content": "RoadKing", "embedding": "[1, 2]", "metadata": {"zone": "west"}})
+    assert text == "RoadKing west"
+
+
+def test_bm25_ranks_identifier_match_first():
+    index = BM25Index(ROWS)
+    hits = index.search("100/35R24")
+    assert hits[0][1] == 0
+    assert sorted(pos for _, pos in index.search("speedocruze pro")) == [1, 3]
+    assert index.search("radial", positions=[2])[0][1] == 2
+    assert index.search("nonexistent") == []
+    assert index.has_identifier_hit("price of 205-55-r16")
+    assert not index.has_identifier_hit("price of roadking")
+
+
+def test_segments_score_like_one_index():
+    whole = BM25Index(ROWS)
+    first = BM25Index(ROWS[:2])
+    second = BM25Index(ROWS[2:], offset=2, avg_length=first.avg_length)
+    for query in ["radial tyre", "speedocruze", "pune stock"]:
+        assert [pos for _, pos in search_segments([first, second], query)] == \
+            [pos for _, pos in whole.search(query)]
+
+
+def test_search_segments_skips_dead_rows():
+    index = BM25Index(ROWS)
+    alive = np.array([True, True, False, True])
+    assert 2 not in [pos for _, pos in search_segments([index], "radial", alive=alive)]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    assert [pos for pos, _ in fused] == [1, 3, 2, 4]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+    assert reciprocal_rank_fusion([[1, 2, 3]], top_k=2) == [(1, pytest.approx(1 / 61)), (2, pytest.approx(1 / 62))]
+    assert reciprocal_rank_fusion([]) == []
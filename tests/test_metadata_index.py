@@ -0,0 +1,70 @@
+import pytest
+
+from Backend.metadata_index import MetadataIndex, PARTIAL_SCORE
+
+METADATA = [
+    {"product_id": "RK-100", "location": "Pune", "dealer_name": "Ravi Traders"},
+    {"product_id": "RK-200", "location": "Chennai"},
+    {"sales_id": 1, "dealer_id": 7, "product_id": "RK-100"},
+    {"claim_id": 2, "dealer_id": "8", "status": "Pending"},
+    None,
+    {"quantity": 1200},
+]
+
+
+@pytest.fixture
+def index():
+    return MetadataIndex(METADATA)
+
+
+def test_exact_fields_match_case_insensitively(index):
+    assert index.match({"product_id": "rk-100"}) == {0: 1.0, 2: 1.0}
+    assert index.match({"status": "pending"}) == {3: 1.0}
+    # Numeric ids never match partially
+    assert index.match({"dealer_id": 1}) == {}
+    assert index.match({"sales_id": "11"}) == {}
+
+
+def test_partial_sku_matches_by_substring():
+    index = MetadataIndex([{"product_id": "100/35R24 50P"}, {"product_id": "205/55R16 91V"},
+                           {"product_id": "100/35R24"}, {"product_id": 10035}, {"category": "Passenger Car"}])
+    assert index.match({"product_id": "100/35r24 50p"}) == {0: 1.0}
+    assert index.match({"product_id": "100/35R24 50P", "category": "Truck"}) == {0: 0.5}
+    # An exact hit does not widen to the longer SKUs containing it
+    assert index.match({"product_id": "100/35R24"}) == {2: 1.0}
+    assert index.match({"product_id": "35R24"}) == {0: PARTIAL_SCORE, 2: PARTIAL_SCORE}
+    assert index.match({"product_id": "R16"}) == {1: PARTIAL_SCORE}
+    assert index.match({"product_id": "100"}) == {}
+    assert index.match({"category": "passenger"}) == {4: PARTIAL_SCORE}
+
+
+def test_string_fields_match_fuzzily(index):
+    matches = index.match({"location": "Pun"})
+    assert list(matches) == [0]
+    assert 0.7 <= matches[0] < 1.0
+    assert index.match({"dealer_name": "ravi traders"}) == {0: 1.0}
+
+
+def test_partial_match_for_non_strings(index):
+    assert index.match({"quantity": 120}) == {5: PARTIAL_SCORE}
+
+
+def test_scores_average_over_filter_keys(index):
+    matches = index.match({"product_id": "RK-100", "location": "Pune"})
+    assert matches == {0: 1.0, 2: 0.5}
+    assert index.match({"product_id": "RK-100", "location": "Pune"}, min_score=0.6) == {0: 1.0}
+
+
+def test_private_rows_are_owned_by_their_dealer(index):
+    assert index.private_owner == {2: "7", 3: "8"}
+
+
+def test_offset_shifts_positions():
+    index = MetadataIndex(METADATA, offset=100)
+    assert index.match({"product_id": "RK-200"}) == {101: 1.0}
+    assert index.private_owner == {102: "7", 103: "8"}
+
+
+def test_empty_filter(index):
+    assert index.match(None) == {}
+    assert index.match({}) == {}
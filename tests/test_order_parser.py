@@ -0,0 +1,64 @@
+import pytest
+
+from Backend.order_parser import MIN_CONFIDENCE, OrderEntities, parse_order
+
+
+@pytest.fixture
+def entities():
+    return OrderEntities(
+        products=[("100/35R24 50P", "RoadKing"), ("205/55R16 91V", "SpeedoCruze Pro"),
+                  ("215/60R16 95H", "SpeedoCruze Pro")],
+        dealers=[(7, "Pooja Singh"), (123, "Ravi Traders")],
+        warehouses=[(2, "Pune"), (3, "Chennai")],
+    )
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Order 50 units of 100/35R24 50P for dealer 123",
+     {"intent": "order", "product_id": "100/35r24 50p", "dealer_id": 123, "quantity": 50}),
+    ("order 5 roadking for dealer 7",
+     {"intent": "order", "product_id": "100/35R24 50P", "dealer_id": 7, "quantity": 5}),
+    ("Place 3 roadking for Pooja Singh from warehouse 2",
+     {"intent": "order", "product_id": "100/35R24 50P", "dealer_id": 7, "warehouse_id": 2, "quantity": 3}),
+])
+def test_well_formed_orders_parse_confidently(entities, text, expected):
+    details, confidence = parse_order(text, entities)
+    assert confidence >= MIN_CONFIDENCE
+    for key, value in expected.items():
+        assert str(details[key]).lower() == str(value).lower()
+
+
+@pytest.mark.parametrize("text", [
+    "order -5 roadking for dealer 7",
+    "order - 5 roadking for dealer 7",
+    "order +5 roadking for dealer 7",
+    "order 0 roadking for dealer 7",
+    "order 2.5 roadking for dealer 7",
+    "order roadking for dealer -7",
+])
+def test_invalid_quantities_fall_back(entities, text):
+    details, confidence = parse_order(text, entities)
+    assert confidence < MIN_CONFIDENCE
+    assert "quantity" not in details
+
+
+@pytest.mark.parametrize("text", [
+    "what is the stock of roadking?",
+    "order 5 speedocruze pro for dealer 7",
+    "order 5 roadking for dealer 7 if it is in stock",
+    "order 5 roadking and 3 speedocruze pro for dealer 7",
+    "show me roadking prices",
+])
+def test_unclear_commands_are_not_confident(entities, text):
+    _, confidence = parse_order(text, entities)
+    assert confidence < MIN_CONFIDENCE
+
+
+def test_ambiguous_product_name_left_to_resolver(entities):
+    details, _ = parse_order("order 5 speedocruze pro for dealer 7", entities)
+    assert details["product_name"] == "speedocruze pro"
+    assert "product_id" not in details
+
+
+def test_empty_entities_never_parse():
+    assert parse_order("order 5 roadking for dealer 7", OrderEntities()) == ({"intent": "unknown"}, 0.0)
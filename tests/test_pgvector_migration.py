@@ -0,0 +1,73 @@
+import os
+import json
+import numpy as np
+import pytest
+
+from Backend import pgvector_migration as migration
+
+# Runs against a scratch Postgres with pgvector; see Backend/pgvector_migration.py
+pytestmark = pytest.mark.skipif(os.getenv("PGVECTOR_TEST") != "1", reason="set PGVECTOR_TEST=1 with a local pgvector")
+
+DIM = 32
+ROWS = 3000
+
+
+@pytest.fixture
+def conn():
+    conn = migration.get_connection()
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, DIM))
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cur.execute("DROP TABLE IF EXISTS vector_store")
+        cur.execute("CREATE TABLE vector_store (id bigserial PRIMARY KEY, content text, metadata text, embedding text)")
+        for i in range(ROWS):
+            vector = centers[i % 20] + rng.normal(scale=0.3, size=DIM)
+            metadata = {"sales_id": i, "dealer_id": str(i % 5)} if i % 3 == 0 else {"product_id": f"P{i}"}
+            cur.execute(
+                "INSERT INTO vector_store (content, metadata, embedding) VALUES (%s, %s, %s)",
+                (f"row {i}", json.dumps(metadata), json.dumps(vector.tolist())),
+            )
+    conn.commit()
+    migration.add_vector_column(conn, DIM)
+    migration.convert_embeddings(conn)
+    migration.create_vector_index(conn, method="hnsw")
+    migration.create_match_function(conn, DIM)
+    yield conn
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS vector_store")
+    conn.commit()
+    conn.close()
+
+
+def test_match_fills_overfetch_beyond_default_ef_search(conn):
+    # match_count 50 is above pgvector's default ef_search of 40
+    recall, fill = migration.verify_recall(conn, samples=10, match_count=50)
+    assert fill == 1.0
+    assert recall >= 0.9
+
+
+def test_dealer_only_sees_own_private_rows(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT embedding_vec::text FROM vector_store WHERE id = 1")
+        query = cur.fetchone()[0]
+        cur.execute("SELECT row_data ->> 'metadata' FROM match_vector_store(%s::vector, 200, -1, '2')", (query,))
+        rows = [json.loads(row[0]) for row in cur.fetchall()]
+    conn.rollback()
+    assert len(rows) == 200
+    assert all(row.get("dealer_id") == "2" for row in rows if "sales_id" in row)
+
+
+def test_tombstoned_rows_are_not_returned(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT embedding_vec::text FROM vector_store WHERE id = 1")
+        query = cur.fetchone()[0]
+        cur.execute("SELECT row_data ->> 'id' FROM match_vector_store(%s::vector, 1, -1, NULL)", (query,))
+        assert cur.fetchone()[0] == "1"
+        cur.execute("UPDATE vector_store SET is_deleted = true WHERE id = 1")
+        cur.execute("SELECT row_data ->> 'id' FROM match_vector_store(%s::vector, 50, -1, NULL)", (query,))
+        ids = [row[0] for row in cur.fetchall()]
+    conn.rollback()
+    assert len(ids) == 50
+    assert "1" not in ids
@@ -0,0 +1,80 @@
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from Backend.flow_control import Deadline, DeadlineExceeded
+from Backend.pipeline import StageGraph, StageTimings
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        yield pool
+
+
+def test_dependencies_receive_results(executor):
+    graph = StageGraph()
+    graph.add("a", lambda: 2)
+    graph.add("b", lambda: 3)
+    graph.add("sum", lambda a, b: a + b, deps=["a", "b"])
+    results, elapsed = graph.run(executor)
+    assert results["sum"] == 5
+    assert set(elapsed) == {"a", "b", "sum"}
+    assert graph.late == []
+
+
+def test_unknown_dependency_rejected():
+    with pytest.raises(ValueError):
+        StageGraph().add("b", lambda a: a, deps=["a"])
+
+
+def test_stage_error_propagates(executor):
+    def fail():
+        raise RuntimeError("boom")
+
+    graph = StageGraph().add("fail", fail)
+    with pytest.raises(RuntimeError):
+        graph.run(executor)
+
+
+def test_deadline_uses_fallbacks_for_late_stages(executor):
+    release = threading.Event()
+    graph = StageGraph()
+    graph.add("fast", lambda: "fast")
+    graph.add("slow", lambda: release.wait(5) and "slow", fallback="fallback")
+    graph.add("after", lambda slow: slow + "!", deps=["slow"], fallback="skipped")
+    start = time.monotonic()
+    results, _ = graph.run(executor, deadline=Deadline(0.2))
+    release.set()
+    assert time.monotonic() - start < 2
+    assert results == {"fast": "fast", "slow": "fallback", "after": "skipped"}
+    assert graph.late == ["after", "slow"]
+
+
+def test_deadline_without_fallback_raises(executor):
+    release = threading.Event()
+    graph = StageGraph().add("slow", lambda: release.wait(5))
+    try:
+        with pytest.raises(DeadlineExceeded):
+            graph.run(executor, deadline=Deadline(0.1))
+    finally:
+        release.set()
+
+
+def test_stages_see_callers_context(executor):
+    user = contextvars.ContextVar("user", default=None)
+    user.set("dealer-7")
+    results, _ = StageGraph().add("who", user.get).run(executor)
+    assert results["who"] == "dealer-7"
+
+
+def test_stage_timings_percentiles():
+    timings = StageTimings()
+    for ms in range(1, 101):
+        timings.record("sql", ms / 1000)
+    assert timings.percentile("sql", 0.5) == pytest.approx(0.051)
+    assert timings.percentile("sql", 0.5, min_samples=200) is None
+    assert timings.stats()["sql"]["count"] == 100
@@ -0,0 +1,162 @@
+import pytest
+import requests
+
+from Backend import rag
+from Backend.cache import EmbeddingCache
+from Backend.vector_index import VectorIndex, current_snapshot_name
+
+
+class StreamedResponse(requests.Response):
+    """Streamed chat completion whose body is `lines`; records close()"""
+
+    def __init__(self, status_code, lines=()):
+        super().__init__()
+        self.status_code = status_code
+        self.lines = lines
+        self.closed = False
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+    def close(self):
+        self.closed = True
+
+
+def stream_with(monkeypatch, response):
+    monkeypatch.setattr(rag, "post_json", lambda *args, **kwargs: response)
+    return rag.stream_llm_final_response("sql", "rag", "stock of roadking")
+
+
+def test_stream_yields_deltas_and_closes(monkeypatch):
+    response = StreamedResponse(200, [
+        'data: {"choices": []}',
+        'data: {"choices": [{"delta": {"content": "Roadking "}}]}',
+        "",
+        'data: {"choices": [{"delta": {"content": "is in stock."}}]}',
+        "data: [DONE]",
+    ])
+    assert list(stream_with(monkeypatch, response)) == ["Roadking ", "is in stock."]
+    assert response.closed
+
+
+def test_stream_error_status_closes_response(monkeypatch):
+    response = StreamedResponse(500)
+    with pytest.raises(requests.HTTPError):
+        list(stream_with(monkeypatch, response))
+    assert response.closed
+
+
+@pytest.fixture
+def context_stages(monkeypatch):
+    """gather_contexts with every stage but the chat completions stubbed; records the metadata filter"""
+    filters = []
+    monkeypatch.setattr(rag, "get_llm_sql", lambda *args: "NO_SQL")
+    monkeypatch.setattr(rag, "fetch_conversation_rows", lambda *args: [])
+    monkeypatch.setattr(rag, "identifier_query", lambda query: False)
+    monkeypatch.setattr(rag, "get_embedding", lambda *args: [0.0])
+
+    def search(embedding, metadata_filter=None, **kwargs):
+        filters.append(metadata_filter)
+        return []
+
+    monkeypatch.setattr(rag, "vector_store_similarity_search", search)
+    return filters
+
+
+@pytest.mark.parametrize("combined, stages", [(True, ["rewrite_metadata"]), (False, ["metadata", "rewrite"])])
+def test_unavailable_chat_upstream_marks_context_degraded(monkeypatch, context_stages, combined, stages):
+    def unavailable(*args, **kwargs):
+        raise rag.UpstreamUnavailable("chat: breaker open")
+
+    monkeypatch.setattr(rag, "COMBINED_REWRITE_METADATA", combined)
+    monkeypatch.setattr(rag, "post_json", unavailable)
+    *_, degraded = rag.gather_contexts(f"claims of dealer 7 in pune ({combined})", None)
+    assert degraded == stages
+    assert context_stages == [None]
+
+
+@pytest.mark.parametrize("cache, sent, cached", [
+    (True, ["row one", "row two"], 3),
+    (False, ["cached query", "row one", "row two"], 1),
+])
+def test_bulk_embeddings_bypass_cache_when_asked(monkeypatch, cache, sent, cached):
+    requests_sent = []
+
+    def embed_chunk(texts):
+        requests_sent.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    embedding_cache = EmbeddingCache("test", maxsize=8)
+    embedding_cache.put("cached query", [1.0, 0.0])
+    monkeypatch.setattr(rag, "embedding_cache", embedding_cache)
+    monkeypatch.setattr(rag, "embed_chunk", embed_chunk)
+
+    embeddings, errors = rag.get_embeddings(["cached query", "row one", "row two"], batch_size=2, cache=cache)
+    assert errors == [None] * 3
+    assert embeddings[1:] == [[7.0, 1.0], [7.0, 1.0]]
+    assert sorted(requests_sent) == sent
+    # Ingest text never lands in the query cache
+    assert embedding_cache.memory.stats()["size"] == cached
+
+
+def test_snapshot_deltas_are_published_at_most_once_per_interval(monkeypatch, tmp_path):
+    rows = [{"id": i, "embedding": [float(i == j) for j in range(4)], "updated_at": 1} for i in range(4)]
+    published = VectorIndex.from_rows(rows, updated_column="updated_at")
+    published.save_snapshot(str(tmp_path))
+    delta = [{"id": 9, "embedding": [1.0, 1.0, 0.0, 0.0], "updated_at": 2}]
+    monkeypatch.setattr(rag, "VECTOR_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(rag, "VECTOR_INDEX", VectorIndex.load_snapshot(str(tmp_path)))
+    monkeypatch.setattr(rag, "fetch_vector_store_rows", lambda since=None: delta)
+
+    monkeypatch.setattr(rag, "VECTOR_SNAPSHOT_PUBLISH_SECONDS", 3600)
+    assert len(rag.refresh_vector_index()) == 4
+
+    monkeypatch.setattr(rag, "VECTOR_SNAPSHOT_PUBLISH_SECONDS", 0)
+    index = rag.refresh_vector_index()
+    assert len(index) == 5
+    assert index.snapshot == current_snapshot_name(str(tmp_path))
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"rewritten_query": " roadking stock in pune ", "metadata": {"product_name": "RoadKing", "location": "Pune"}}',
+     ("roadking stock in pune", {"product_name": "RoadKing", "location": "Pune"})),
+    ('```json\n{"rewritten_query": "claims of dealer 7", "metadata": {"dealer_id": 7, "status": ""}}\n```',
+     ("claims of dealer 7", {"dealer_id": 7})),
+    # Unusable values are dropped, and no usable field means no filter
+    ('{"rewritten_query": "total sales", "metadata": {"zone": null, "dealer": {"id": 7}, "ids": [1, 2]}}',
+     ("total sales", None)),
+])
+def test_parse_rewrite_and_metadata(content, expected):
+    assert rag.parse_rewrite_and_metadata(content) == expected
+
+
+@pytest.mark.parametrize("content", [
+    "roadking stock in pune",
+    '{"rewritten_query": "roadking stock", "metadata": {"location": "Pune"}',
+    "",
+])
+def test_parse_rewrite_and_metadata_rejects_malformed_json(content):
+    with pytest.raises(ValueError):
+        rag.parse_rewrite_and_metadata(content)
+
+
+@pytest.mark.parametrize("content", [
+    '["roadking stock", {}]',
+    '{"rewritten_query": "roadking stock"}',
+    '{"rewritten_query": "roadking stock", "metadata": {}, "intent": "info"}',
+    '{"rewritten_query": 42, "metadata": {}}',
+    '{"rewritten_query": "   ", "metadata": {}}',
+    '{"rewritten_query": "roadking stock", "metadata": "Pune"}',
+    '{"rewritten_query": "roadking stock", "metadata": null}',
+])
+def test_parse_rewrite_and_metadata_rejects_wrong_types(content):
+    with pytest.raises(ValueError):
+        rag.parse_rewrite_and_metadata(content)
+
+
+def test_invalid_combined_response_falls_back_to_separate_calls(monkeypatch):
+    monkeypatch.setattr(rag, "identifier_query", lambda query: False)
+    monkeypatch.setattr(rag, "chat_completion_content", lambda *args: '{"rewritten_query": 42, "metadata": {}}')
+    monkeypatch.setattr(rag, "rewrite_query_for_rag", lambda *args, **kwargs: "separate rewrite")
+    monkeypatch.setattr(rag, "extract_metadata_with_llm", lambda *args, **kwargs: {"location": "Pune"})
+    assert rag.rewrite_and_extract_metadata("roadking stock pune") == ("separate rewrite", {"location": "Pune"})
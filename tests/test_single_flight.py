@@ -0,0 +1,97 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from Backend.cache import SingleFlight
+from Backend.flow_control import Deadline, DeadlineExceeded, UpstreamUnavailable
+
+
+def start_leader(flight, key, fn):
+    """Run `fn` as the leader on a background thread; returns (future, pool)"""
+    started = threading.Event()
+
+    def leader():
+        started.set()
+        return fn()
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    future = pool.submit(flight.do, key, leader)
+    started.wait(1)
+    return future, pool
+
+
+def test_followers_share_the_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    future, pool = start_leader(flight, "k", lambda: release.wait(2) and "value")
+    with ThreadPoolExecutor(max_workers=4) as followers:
+        results = [followers.submit(flight.do, "k", lambda: "own") for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+        assert [r.result(2) for r in results] == ["value"] * 4
+    assert future.result(2) == "value"
+    pool.shutdown()
+    assert flight.stats()["coalesced"] == 4
+    assert flight.stats()["inflight"] == 0
+
+
+def test_follower_times_out_on_its_own_deadline():
+    flight = SingleFlight()
+    release = threading.Event()
+    future, pool = start_leader(flight, "k", lambda: release.wait(5) and "value")
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        flight.do("k", lambda: "own", Deadline(0.1))
+    assert time.monotonic() - start < 1
+    release.set()
+    assert future.result(2) == "value"
+    pool.shutdown()
+    assert flight.stats()["follower_timeouts"] == 1
+
+
+@pytest.mark.parametrize("error", [DeadlineExceeded("leader budget"), UpstreamUnavailable("queue full")])
+def test_follower_retries_after_leader_specific_error(error):
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing_leader():
+        release.wait(2)
+        raise error
+
+    future, pool = start_leader(flight, "k", failing_leader)
+    with ThreadPoolExecutor(max_workers=1) as follower:
+        result = follower.submit(flight.do, "k", lambda: "own", Deadline(2))
+        time.sleep(0.05)
+        release.set()
+        assert result.result(2) == "own"
+    with pytest.raises(type(error)):
+        future.result(2)
+    pool.shutdown()
+    assert flight.stats()["retried"] == 1
+
+
+def test_follower_shares_other_errors():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing_leader():
+        release.wait(2)
+        raise ValueError("bad response")
+
+    future, pool = start_leader(flight, "k", failing_leader)
+    with ThreadPoolExecutor(max_workers=1) as follower:
+        result = follower.submit(flight.do, "k", lambda: "own")
+        time.sleep(0.05)
+        release.set()
+        with pytest.raises(ValueError):
+            result.result(2)
+    pool.shutdown()
+
+
+def test_nothing_kept_after_completion():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == 1
+    assert flight.do("k", lambda: 2) == 2
+    assert flight.stats()["leaders"] == 2
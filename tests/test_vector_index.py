@@ -0,0 +1,247 @@
+import json
+
+import numpy as np
+import pytest
+
+from Backend.vector_index import VectorIndex, snapshot_age
+
+DIM = 16
+
+
+def make_row(row_id, seed=None, updated_at=1, **metadata):
+    vector = np.random.default_rng(row_id if seed is None else seed).normal(size=DIM)
+    return {"id": row_id, "content": f"row {row_id}", "embedding": json.dumps(vector.tolist()),
+            "metadata": json.dumps(metadata), "updated_at": updated_at}
+
+
+def build(count=20, metadata=None, **kwargs):
+    rows = [make_row(i, **(metadata or {})) for i in range(count)]
+    return VectorIndex.from_rows(rows, updated_column="updated_at", **kwargs)
+
+
+def query_for(row):
+    return json.loads(row["embedding"])
+
+
+def top_id(index, query, **kwargs):
+    score, pos = index.search(query, top_k=1, **kwargs)[0]
+    return index.ids[pos], score
+
+
+def test_from_rows_skips_bad_embeddings():
+    rows = [make_row(i) for i in range(3)] + [{"id": 99, "embedding": "not json"},
+                                              {"id": 98, "embedding": [1.0, 2.0]}]
+    index = VectorIndex.from_rows(rows, updated_column="updated_at")
+    assert len(index) == 3
+    assert index.dim == DIM
+    assert index.watermark == 1
+
+
+def test_delta_appends_without_copying_and_keeps_old_version():
+    index = build()
+    data_before = index.matrix.__array_interface__["data"][0]
+    new = make_row(100, updated_at=2)
+    updated = index.apply_delta([new], updated_column="updated_at")
+
+    assert updated is not index
+    assert updated.version == index.version + 1
+    assert len(updated) == 21 and len(index) == 20
+    assert updated.matrix.__array_interface__["data"][0] == data_before
+    assert top_id(updated, query_for(new))[0] == 100
+    assert 100 not in index.id_to_pos
+    assert updated.watermark == 2
+
+
+def test_changed_row_is_tombstoned_and_reappended():
+    index = build()
+    changed = make_row(5, seed=500, updated_at=2)
+    updated = index.apply_delta([changed], updated_column="updated_at")
+
+    old_pos = index.id_to_pos[5]
+    assert not updated.alive[old_pos]
+    assert updated.id_to_pos[5] == 20
+    assert updated.dead_count == 1
+    assert len(updated) == 20
+    # The old vector no longer finds row 5; the new one does
+    assert top_id(updated, query_for(make_row(5)))[0] != 5
+    assert top_id(updated, query_for(changed)) == (5, pytest.approx(1.0, abs=1e-5))
+    assert updated.rows[updated.id_to_pos[5]]["updated_at"] == 2
+
+
+def test_deleted_row_never_matches():
+    index = build()
+    deleted = {**make_row(3, updated_at=2), "is_deleted": True}
+    updated = index.apply_delta([deleted], updated_column="updated_at", deleted_column="is_deleted")
+    assert 3 not in updated.id_to_pos
+    hits = updated.search(query_for(make_row(3)), top_k=20)
+    assert all(updated.ids[pos] != 3 for _, pos in hits)
+
+
+def test_already_applied_rows_return_same_version():
+    index = build()
+    assert index.apply_delta([make_row(4)], updated_column="updated_at") is index
+    assert index.apply_delta([], updated_column="updated_at") is index
+
+
+def test_compaction_after_many_tombstones():
+    index = build()
+    updated = index.apply_delta([make_row(i, seed=1000 + i, updated_at=2) for i in range(6)],
+                                updated_column="updated_at")
+    assert updated.dead_count == 0
+    assert len(updated.ids) == 20
+    assert top_id(updated, query_for(make_row(2, seed=1002)))[0] == 2
+
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = build().apply_delta([make_row(5, seed=500, updated_at=2)], updated_column="updated_at")
+    name = index.save_snapshot(str(tmp_path))
+    loaded = VectorIndex.load_snapshot(str(tmp_path))
+
+    assert loaded.snapshot == name
+    assert loaded.version == index.version
+    assert loaded.watermark == index.watermark
+    assert loaded.dead_count == 0
+    assert sorted(loaded.ids) == sorted(index.id_to_pos)
+    assert not loaded.matrix.flags.writeable
+    query = query_for(make_row(5, seed=500))
+    assert top_id(loaded, query) == top_id(index, query)
+
+    # A delta on the read-only mapped matrix copies into a fresh store
+    updated = loaded.apply_delta([make_row(300, updated_at=3)], updated_column="updated_at")
+    assert top_id(updated, query_for(make_row(300)))[0] == 300
+
+
+def test_load_snapshot_missing_directory(tmp_path):
+    assert VectorIndex.load_snapshot(str(tmp_path / "missing")) is None
+    assert snapshot_age(str(tmp_path / "missing")) == float("inf")
+
+
+def test_snapshot_age_follows_current(tmp_path):
+    build().save_snapshot(str(tmp_path))
+    assert snapshot_age(str(tmp_path)) < 5
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_quantized_rerank_matches_exact_search(storage):
+    rng = np.random.default_rng(0)
+    rows = [{"id": i, "embedding": rng.normal(size=DIM).tolist()} for i in range(500)]
+    exact = VectorIndex.from_rows(rows)
+    quantized = VectorIndex.from_rows(rows, storage=storage)
+    assert quantized.scoring_nbytes < exact.scoring_nbytes
+
+    for query in rng.normal(size=(20, DIM)):
+        expected = exact.search(query, top_k=10)
+        reranked = quantized.search(query, top_k=10, rerank=4)
+        assert [pos for _, pos in reranked] == [pos for _, pos in expected]
+        # Re-ranked scores come from the float32 rows
+        assert [score for score, _ in reranked] == pytest.approx([score for score, _ in expected], abs=1e-6)
+        approximate = quantized.search(query, top_k=10)
+        assert len(set(pos for _, pos in approximate) & set(pos for _, pos in expected)) >= 8
+
+
+def test_quantized_delta_appends_codes():
+    index = build(storage="int8")
+    new = make_row(100, updated_at=2)
+    updated = index.apply_delta([new], updated_column="updated_at")
+    assert updated.codes.shape[0] == updated.matrix.shape[0] == 21
+    assert top_id(updated, query_for(new), rerank=4) == (100, pytest.approx(1.0, abs=1e-5))
+
+
+def clustered_rows(count=4000, clusters=40, seed=7):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, DIM))
+    vectors = centers[rng.integers(clusters, size=count)] + 0.35 * rng.normal(size=(count, DIM))
+    return [{"id": i, "embedding": vector.tolist()} for i, vector in enumerate(vectors)], rng
+
+
+def test_ivf_probing_every_list_is_exact():
+    rows, rng = clustered_rows(count=1000)
+    index = VectorIndex.from_rows(rows)
+    ivf = index.train_ivf(nlist=32)
+    for query in rng.normal(size=(10, DIM)):
+        assert index.search(query, top_k=10, nprobe=ivf.nlist) == index.search(query, top_k=10)
+
+
+def test_ivf_recall_at_default_nprobe():
+    rows, rng = clustered_rows()
+    index = VectorIndex.from_rows(rows)
+    index.train_ivf()
+    vectors = np.array([row["embedding"] for row in rows])
+    queries = vectors[rng.integers(len(rows), size=50)] + 0.35 * rng.normal(size=(50, DIM))
+    recalls = []
+    for query in queries:
+        expected = {pos for _, pos in index.search(query, top_k=10)}
+        # 16 is the default VECTOR_INDEX_NPROBE
+        probed = {pos for _, pos in index.search(query, top_k=10, nprobe=16)}
+        recalls.append(len(expected & probed) / 10)
+    assert np.mean(recalls) >= 0.95
+
+
+def test_ivf_finds_rows_appended_after_training():
+    rows, _ = clustered_rows(count=1000)
+    index = VectorIndex.from_rows(rows, updated_column="updated_at")
+    index.train_ivf(nlist=32)
+    new = make_row(5000, updated_at=2)
+    updated = index.apply_delta([new], updated_column="updated_at")
+    assert updated.ivf.assignments.shape[0] == len(updated.ids)
+    assert top_id(updated, query_for(new), nprobe=1) == (5000, pytest.approx(1.0, abs=1e-5))
+
+
+def test_dealer_partitions():
+    rows = [make_row(0, product_id="RK-100"), make_row(1, sales_id=1, dealer_id=7),
+            make_row(2, claim_id=2, dealer_id="8"), make_row(3, location="Pune")]
+    index = VectorIndex.from_rows(rows)
+    assert index.partition_positions() is None
+    assert list(index.partition_positions(7)) == [0, 1, 3]
+    assert list(index.partition_positions("8")) == [0, 2, 3]
+    assert list(index.partition_positions(9)) == [0, 3]
+    hits = index.search(query_for(rows[2]), top_k=4, positions=index.partition_positions(7))
+    assert 2 not in [pos for _, pos in hits]
+
+
+def test_side_indexes_follow_deltas():
+    index = build(metadata={"dealer_id": "7", "sales_id": 1})
+    updated = index.apply_delta([make_row(200, updated_at=2, product_id="RK-200")], updated_column="updated_at")
+    matches = updated.match_metadata({"product_id": "RK-200"})
+    assert [updated.ids[pos] for pos in matches] == [200]
+    assert updated.lexical_search("rk-200")[0][1] == updated.id_to_pos[200]
+    assert updated.has_identifier_hit("stock of RK-200")
+
+    shared, dealers = updated.partitions
+    assert list(shared) == [updated.id_to_pos[200]]
+    assert len(dealers["7"]) == 20
+    # Segments built for the old version are reused, not rebuilt
+    assert updated.segments[0] is index.segments[0]
+
+
+def test_tombstoned_rows_leave_side_indexes():
+    index = build(metadata={"product_id": "RK-100"})
+    updated = index.apply_delta([make_row(0, seed=900, updated_at=2, product_id="RK-900")],
+                                updated_column="updated_at")
+    assert index.id_to_pos[0] not in updated.match_metadata({"product_id": "RK-100"})
+    assert [updated.ids[pos] for pos in updated.match_metadata({"product_id": "RK-900"})] == [0]
+    assert updated.lexical_search("rk-900")[0][1] == updated.id_to_pos[0]
+    assert index.id_to_pos[0] not in [pos for _, pos in updated.lexical_search("rk-100", top_k=50)]
+
+
+@pytest.mark.parametrize("storage, rerank", [
+    ("float32", 0), ("float16", 0), ("float16", 4), ("int8", 0), ("int8", 4),
+])
+@pytest.mark.parametrize("dealer_id", [None, 7])
+def test_search_batch_matches_search(storage, rerank, dealer_id):
+    rng = np.random.default_rng(1)
+    rows = [make_row(i, seed=2000 + i, **({"sales_id": i, "dealer_id": 7 + i % 3} if i % 4 == 0 else {}))
+            for i in range(300)]
+    # A changed row leaves a tombstone the batch scan must skip too
+    index = VectorIndex.from_rows(rows, storage=storage).apply_delta(
+        [make_row(5, seed=99, updated_at=2)], updated_column="updated_at"
+    )
+    assert index.dead_count == 1
+    positions = index.partition_positions(dealer_id)
+    queries = rng.normal(size=(8, DIM))
+    batch = index.search_batch(queries, top_k=10, positions=positions, rerank=rerank)
+    for query, hits in zip(queries, batch):
+        expected = index.search(query, top_k=10, positions=positions, rerank=rerank)
+        assert [pos for _, pos in hits] == [pos for _, pos in expected]
+        assert [score for score, _ in hits] == pytest.approx([score for score, _ in expected], abs=1e-5)